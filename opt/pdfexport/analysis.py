@@ -0,0 +1,173 @@
+"""Análisis previo del PDF para elegir el método más barato por página.
+
+Con pdftotext -bbox-layout (palabras, líneas y tamaño de cada página),
+pdfimages -list (imágenes y su resolución) y los operadores de dibujo de
+sus flujos de contenido (fingerprint.drawing_pages) cada página se
+clasifica como:
+
+- "texto": hay texto, casi ninguna imagen y ningún trazado vectorial; no
+  se renderiza y se exporta como texto editable.
+- "escaneado": una imagen cubre casi toda la página y apenas hay texto;
+  se exporta como imagen raster, sin pasar por SVG.
+- "mixto" y "vectorial": texto con imágenes, o dibujo sin texto ni
+  imágenes; se renderizan a SVG como hasta ahora.
+
+Una página con texto y trazados (gráficos, diagramas, filetes de tablas)
+es "mixto"; no cuentan un color de fondo que cubre toda la página ni unos
+pocos filetes finos (subrayados, líneas de cabecera). Si no se pueden leer sus flujos de contenido (PDF cifrado,
+filtros no soportados) tampoco se trata como "texto": ante la duda se
+renderiza.
+
+La misma pasada mide el tamaño de página y estima el de letra a partir de
+la altura de las líneas, que usan los escritores nativos de ODT/DOCX.
+"""
+import html
+import os
+import re
+import statistics
+
+import fingerprint
+import runner
+
+TEXT = "texto"
+SCANNED = "escaneado"
+MIXED = "mixto"
+VECTOR = "vectorial"
+
+# Páginas que necesitan renderizarse a SVG
+RENDERED_KINDS = (MIXED, VECTOR)
+
+# Fracción de la página cubierta por imágenes por debajo de la cual se ignoran
+_TEXT_MAX_IMAGE_COVERAGE = 0.05
+# Fracción de la página cubierta por imágenes a partir de la cual se considera escaneada
+_SCAN_MIN_IMAGE_COVERAGE = 0.6
+# Un escaneo con más palabras que estas tiene capa OCR y se trata como mixto
+_SCAN_MAX_WORDS = 10
+
+_PAGE_TAG = re.compile(r'<page width="([\d.]+)" height="([\d.]+)"')
+_WORD_TAG = re.compile(r"<word ")
+_LINE_TAG = re.compile(r'<line xMin="[\d.]+" yMin="([\d.]+)" xMax="[\d.]+" yMax="([\d.]+)"')
+# La caja de una línea abarca ascendentes y descendentes: aprox. 1,2 veces el tamaño de letra
+_LINE_HEIGHT_FACTOR = 1.2
+_MIN_FONT_SIZE = 6.0
+_MAX_FONT_SIZE = 72.0
+
+
+class PageInfo:
+    """Datos de una página usados para clasificarla"""
+
+    def __init__(self, number, width=612.0, height=792.0):
+        self.number = number
+        # Tamaño en puntos
+        self.width = width
+        self.height = height
+        self.words = 0
+        self.images = 0
+        # Superficie cubierta por imágenes, en pulgadas cuadradas
+        self.image_area = 0.0
+        # Altura mediana de las líneas de texto, en puntos (None si no hay texto)
+        self.line_height = None
+        # Si la página pinta trazados vectoriales (None: no se sabe)
+        self.drawings = None
+
+    @property
+    def image_coverage(self):
+        page_area = (self.width / 72) * (self.height / 72)
+        return min(1.0, self.image_area / page_area) if page_area else 0.0
+
+    @property
+    def font_size(self):
+        """Tamaño de letra estimado del texto de la página, en puntos (redondeado a medio punto)"""
+        if not self.line_height:
+            return None
+        size = round(self.line_height / _LINE_HEIGHT_FACTOR * 2) / 2
+        return min(_MAX_FONT_SIZE, max(_MIN_FONT_SIZE, size))
+
+    @property
+    def kind(self):
+        coverage = self.image_coverage
+        if self.words and coverage < _TEXT_MAX_IMAGE_COVERAGE and self.drawings is False:
+            return TEXT
+        if coverage >= _SCAN_MIN_IMAGE_COVERAGE and self.words <= _SCAN_MAX_WORDS:
+            return SCANNED
+        if not self.words and not self.images:
+            return VECTOR
+        return MIXED
+
+
+def _read_bbox(pdf_file, bbox_file, first, last):
+    """Contar las palabras y medir páginas y líneas a partir de pdftotext -bbox-layout"""
+    runner.run(["pdftotext", "-bbox-layout", "-f", str(first), "-l", str(last), pdf_file, bbox_file],
+               stage="pdftotext-bbox", inputs=[pdf_file], outputs=[bbox_file])
+    infos = []
+    heights = []
+
+    def close_page():
+        if infos and heights:
+            infos[-1].line_height = statistics.median(heights)
+        heights.clear()
+
+    with open(bbox_file, encoding="utf-8", errors="replace") as bbox_in:
+        for line in bbox_in:
+            match = _PAGE_TAG.search(line)
+            if match:
+                close_page()
+                infos.append(PageInfo(first + len(infos), float(match.group(1)), float(match.group(2))))
+            elif infos and _WORD_TAG.search(line):
+                # Las palabras formadas sólo por espacios no cuentan
+                if html.unescape(line.split(">", 1)[-1].rsplit("<", 1)[0]).strip():
+                    infos[-1].words += 1
+            elif infos:
+                match = _LINE_TAG.search(line)
+                if match:
+                    heights.append(float(match.group(2)) - float(match.group(1)))
+    close_page()
+    infos += [PageInfo(number) for number in range(first + len(infos), last + 1)]
+    return infos[:last - first + 1]
+
+
+def _read_images(pdf_file, infos, first, last):
+    """Sumar la superficie de las imágenes de cada página a partir de pdfimages -list"""
+    result = runner.run(["pdfimages", "-list", "-f", str(first), "-l", str(last), pdf_file],
+                        stage="pdfimages-list", inputs=[pdf_file])
+    for line in result.stdout.splitlines()[2:]:
+        cols = line.split()
+        # page num type width height color comp bpc enc interp object ID x-ppi y-ppi size ratio
+        if len(cols) < 14 or cols[2] != "image":
+            continue
+        try:
+            page, width, height = int(cols[0]), int(cols[3]), int(cols[4])
+            x_ppi, y_ppi = float(cols[12]), float(cols[13])
+        except ValueError:
+            continue
+        if first <= page <= last:
+            info = infos[page - first]
+            info.images += 1
+            if x_ppi > 0 and y_ppi > 0:
+                info.image_area += (width / x_ppi) * (height / y_ppi)
+
+
+def measure(infos):
+    """Tamaño de página (el más frecuente) y de letra (mediana) del texto de las páginas analizadas.
+
+    Devuelve {"page_size": [ancho, alto], "font_size": puntos} sin las claves que no se pudieron medir.
+    """
+    layout = {}
+    sizes = [(info.width, info.height) for info in infos if info.width and info.height]
+    if sizes:
+        layout["page_size"] = list(max(set(sizes), key=sizes.count))
+    font_sizes = [info.font_size for info in infos if info.font_size]
+    if font_sizes:
+        layout["font_size"] = statistics.median_low(font_sizes)
+    return layout
+
+
+def analyze(pdf_file, work_dir, first, last):
+    """Clasificar las páginas first..last del PDF; devuelve la lista de PageInfo en orden de página"""
+    infos = _read_bbox(pdf_file, os.path.join(work_dir, "bbox.html"), first, last)
+    _read_images(pdf_file, infos, first, last)
+    drawings = fingerprint.drawing_pages(pdf_file)
+    if drawings is not None and len(drawings) >= last:
+        for info in infos:
+            info.drawings = drawings[info.number - 1]
+    return infos
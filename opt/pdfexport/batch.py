@@ -0,0 +1,148 @@
+"""Conversión por lotes repartida en un pool de procesos"""
+import glob
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import engine
+import tracing
+
+
+def collect_pdfs(target):
+    """Obtener la lista ordenada de PDF a partir de una carpeta, un patrón glob o un archivo"""
+    if os.path.isdir(target):
+        paths = [os.path.join(target, f) for f in os.listdir(target)]
+    else:
+        paths = glob.glob(os.path.expanduser(target), recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(".pdf"))
+
+
+def convert_one(pdf_file, output_dir, formats, options):
+    """Convertir un archivo dentro de un proceso del pool; nunca lanza excepciones"""
+    start = time.monotonic()
+    summary = {"pdf_file": pdf_file, "formats": list(formats)}
+    try:
+        results = engine.export_pdf(pdf_file, output_dir, formats, options=options)
+        summary["outputs"] = [result.as_dict() for result in results]
+        summary["ok"] = True
+    except Exception as e:
+        summary["ok"] = False
+        summary["error"] = str(e)
+        # Las conversiones fallidas también dejan traza: son las que más interesa revisar
+        if options is not None and options.trace_dir:
+            trace_file = engine.trace_file_path(pdf_file, options.trace_dir)
+            if os.path.isfile(trace_file):
+                summary["trace_file"] = trace_file
+    summary["seconds"] = round(time.monotonic() - start, 3)
+    return summary
+
+
+def run_batch(pdf_files, output_dir, formats=("docx",), jobs=None, on_result=None, options=None):
+    """Convertir pdf_files a los formatos indicados con como máximo `jobs` procesos simultáneos.
+
+    Sólo se mantienen en vuelo dos tareas por proceso para que las listas
+    de miles de archivos no se encolen de golpe. on_result recibe el
+    resumen de cada archivo en cuanto termina. Devuelve la lista de
+    resúmenes en el orden de entrada. Si un proceso del pool muere, los
+    archivos en vuelo cuentan como fallidos y el lote sigue con un pool nuevo.
+    """
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    options = (options or engine.ConversionOptions()).for_jobs(jobs)
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    pending = iter(enumerate(pdf_files))
+    in_flight = {}
+    pool = ProcessPoolExecutor(max_workers=jobs)
+
+    def submit_next():
+        nonlocal pending
+        for index, pdf_file in pending:
+            try:
+                future = pool.submit(convert_one, pdf_file, output_dir, formats, options)
+            except BrokenProcessPool:
+                # Se vuelve a enviar cuando se haya reiniciado el pool
+                pending = itertools.chain([(index, pdf_file)], pending)
+                return False
+            in_flight[future] = (index, pdf_file, time.monotonic())
+            return True
+        return False
+
+    def finish(index, summary):
+        results[index] = summary
+        if on_result is not None:
+            on_result(summary)
+
+    try:
+        for _ in range(jobs * 2):
+            if not submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                index, pdf_file, started = in_flight.pop(future)
+                try:
+                    summary = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    summary = _crashed(pdf_file, formats, started)
+                finish(index, summary)
+            if broken:
+                # Un proceso del pool murió (OOM, fallo en una herramienta): no se sabe con
+                # qué archivo, así que todos los que estaban en vuelo cuentan como fallidos
+                for index, pdf_file, started in in_flight.values():
+                    finish(index, _crashed(pdf_file, formats, started))
+                in_flight.clear()
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=jobs)
+            while len(in_flight) < jobs * 2 and submit_next():
+                pass
+    finally:
+        pool.shutdown()
+
+    return [results[i] for i in sorted(results)]
+
+
+def _crashed(pdf_file, formats, started):
+    """Resumen de un archivo perdido porque su proceso murió"""
+    return {"pdf_file": pdf_file, "formats": list(formats), "ok": False,
+            "error": "El proceso de conversión terminó de forma inesperada",
+            "seconds": round(time.monotonic() - started, 3)}
+
+
+def write_trace_summary(results, path):
+    """Agregar las trazas JSON de los trabajos del lote en un único resumen"""
+    trace_files = set()
+    for summary in results:
+        if summary.get("trace_file"):
+            trace_files.add(summary["trace_file"])
+        trace_files.update(output["trace_file"] for output in summary.get("outputs", [])
+                           if output.get("trace_file"))
+    traces = []
+    for trace_file in sorted(trace_files):
+        try:
+            with open(trace_file, encoding="utf-8") as f:
+                traces.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    data = tracing.aggregate(traces)
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(data, out, ensure_ascii=False, indent=2)
+    return data
+
+
+def write_summary(results, path):
+    """Guardar el resumen del lote en formato JSON"""
+    data = {
+        "total": len(results),
+        "ok": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "files": results,
+    }
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(data, out, ensure_ascii=False, indent=2)
+    return data
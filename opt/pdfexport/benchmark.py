@@ -0,0 +1,267 @@
+"""Banco de pruebas de rendimiento de la conversión.
+
+Genera sin conexión un corpus determinista de PDF con ghostscript (sólo
+texto, mucho vector, muchas imágenes, 1 página y 500 páginas), convierte
+cada documento a cada formato en un proceso nuevo y mide el tiempo, el
+rendimiento (páginas/s, documentos/min), el pico de memoria y el tiempo
+de cada etapa. Los resultados se comparan con una referencia guardada y
+se informa de las regresiones que superen los umbrales.
+
+Uso:
+    python3 benchmark.py [--formats docx odt] [--baseline archivo.json] [--update-baseline]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cache
+import deps
+import engine
+
+# Umbrales de regresión respecto a la referencia (fracción)
+DEFAULT_TIME_THRESHOLD = 0.20
+DEFAULT_MEMORY_THRESHOLD = 0.25
+# Diferencias de tiempo menores que esta (segundos) se consideran ruido
+_MIN_TIME_DELTA = 0.05
+
+_TEXT_PAGE = """
+/Helvetica findfont 10 scalefont setfont
+/textpage {
+  /n exch def
+  72 750 moveto (Quirinux PDF Export - benchmark - page ) show n 10 string cvs show
+  0 1 54 {
+    /i exch def
+    72 730 i 12 mul sub moveto
+    (Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor, line ) show
+    i 10 string cvs show
+  } for
+  showpage
+} def
+"""
+
+_VECTOR_PAGE = """
+/vectorpage {
+  /n exch def
+  0.2 setlinewidth
+  0 1 199 {
+    /k exch def
+    newpath
+    300 400 moveto
+    0 1 99 {
+      /i exch def
+      /a k 100 mul i add n 37 mul add def
+      300 250 a 7 mul sin mul add
+      400 350 a 13 mul cos mul add
+      lineto
+    } for
+    stroke
+  } for
+  showpage
+} def
+"""
+
+_IMAGE_PAGE = """
+/imgstr 256 string def
+/imagepage {
+  /n exch def
+  0 1 255 { imgstr exch dup n 17 mul add 256 mod put } for
+  0 1 3 {
+    /q exch def
+    gsave
+    72 q 2 mod 240 mul add 80 q 2 idiv 340 mul add translate
+    220 300 scale
+    256 256 8 [256 0 0 -256 0 256] { imgstr } image
+    grestore
+  } for
+  showpage
+} def
+"""
+
+# Nombre → (páginas, programa PostScript que dibuja una página)
+CORPUS = {
+    "texto": (20, _TEXT_PAGE + "1 1 20 { textpage } for\n"),
+    "vectorial": (5, _VECTOR_PAGE + "1 1 5 { vectorpage } for\n"),
+    "imagenes": (10, _IMAGE_PAGE + "1 1 10 { imagepage } for\n"),
+    "una-pagina": (1, _TEXT_PAGE + "1 textpage\n"),
+    "500-paginas": (500, _TEXT_PAGE + "1 1 500 { textpage } for\n"),
+}
+
+
+def default_corpus_dir():
+    return os.path.join(cache.default_cache_dir(), "benchmark-corpus")
+
+
+def default_baseline():
+    """Referencia junto a este módulo, no en la carpeta desde la que se lanza"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-baseline.json")
+
+
+def _corpus_file(corpus_dir, name, program, gs_version):
+    """Ruta del PDF del corpus: cambia si cambia su programa PostScript o la versión de ghostscript"""
+    digest = hashlib.sha1(f"{gs_version}\n{program}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(corpus_dir, f"{name}-{digest}.pdf")
+
+
+def build_corpus(corpus_dir, names=None):
+    """Generar con ghostscript los PDF que falten; devuelve {nombre: (ruta, páginas)}"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    gs_version = deps.get_registry().version("gs") or ""
+    corpus = {}
+    for name in names or CORPUS:
+        pages, program = CORPUS[name]
+        pdf_file = _corpus_file(corpus_dir, name, program, gs_version)
+        if not os.path.exists(pdf_file):
+            # Los generados con otro programa u otra versión ya no se usan
+            for stale in glob.glob(os.path.join(glob.escape(corpus_dir), f"{name}-*.pdf")):
+                os.remove(stale)
+            ps_file = os.path.join(corpus_dir, f"{name}.ps")
+            with open(ps_file, "w", encoding="ascii") as ps_out:
+                ps_out.write("%!PS\n" + program)
+            # Sin fechas ni identificadores: el mismo programa da siempre el mismo PDF
+            subprocess.run(["gs", "-q", "-dNOPAUSE", "-dBATCH", "-dSAFER", "-sDEVICE=pdfwrite",
+                            "-dOmitInfoDate", "-dOmitID", "-dOmitXMP",
+                            f"-sOutputFile={pdf_file}.tmp", ps_file],
+                           check=True, capture_output=True, text=True,
+                           env=dict(os.environ, SOURCE_DATE_EPOCH="0"))
+            os.remove(ps_file)
+            os.replace(pdf_file + ".tmp", pdf_file)
+        corpus[name] = (pdf_file, pages)
+    return corpus
+
+
+def _run_once(pdf_file, output_format):
+    """Convertir un documento (en un proceso nuevo) y devolver sus métricas"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        trace_dir = os.path.join(work_dir, "trazas")
+        options = engine.ConversionOptions(use_cache=False, trace_dir=trace_dir)
+        start = time.monotonic()
+        result = engine.convert_pdf(pdf_file, work_dir, output_format, options=options)
+        wall = time.monotonic() - start
+        with open(result.trace_file, encoding="utf-8") as f:
+            trace = json.load(f)
+        output_bytes = os.path.getsize(result.output_path)
+
+    stages = {}
+    for record in trace["stages"]:
+        stages[record["stage"]] = stages.get(record["stage"], 0.0) + record["wall"]
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "wall": wall,
+        "method": result.method,
+        "output_bytes": output_bytes,
+        "subprocesses": result.subprocesses,
+        # Pico de memoria del proceso y de la herramienta externa más grande (KB)
+        "peak_rss_kb": max(children.ru_maxrss, own.ru_maxrss),
+        "child_cpu": children.ru_utime + children.ru_stime,
+        "stages": stages,
+    }
+
+
+def run_benchmark(corpus, formats, repeat=1):
+    """Medir cada documento en cada formato; con repeat > 1 se queda con la ejecución más rápida"""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, (pdf_file, pages) in corpus.items():
+        for output_format in formats:
+            runs = []
+            for _ in range(repeat):
+                # Un proceso nuevo por ejecución para medir su pico de memoria por separado
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs.append(pool.submit(_run_once, pdf_file, output_format).result())
+            best = min(runs, key=lambda run: run["wall"])
+            best["pages"] = pages
+            best["pages_per_second"] = pages / best["wall"] if best["wall"] else None
+            best["docs_per_minute"] = 60 / best["wall"] if best["wall"] else None
+            results[f"{name}/{output_format}"] = best
+            print(f"{name:>12} {output_format:>4}  {best['wall']:8.2f} s  "
+                  f"{best['pages_per_second']:8.1f} pág/s  {best['peak_rss_kb'] / 1024:8.1f} MB  "
+                  f"{best['method']}")
+            sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, time_threshold=DEFAULT_TIME_THRESHOLD,
+            memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    """Devolver la lista de regresiones respecto a la referencia"""
+    regressions = []
+    for key, current in sorted(results.items()):
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            continue
+        if (current["wall"] > previous["wall"] * (1 + time_threshold)
+                and current["wall"] - previous["wall"] > _MIN_TIME_DELTA):
+            regressions.append(f"{key}: tiempo {previous['wall']:.2f} s -> {current['wall']:.2f} s")
+        if current["peak_rss_kb"] > previous["peak_rss_kb"] * (1 + memory_threshold):
+            regressions.append(f"{key}: memoria {previous['peak_rss_kb'] / 1024:.1f} MB -> "
+                               f"{current['peak_rss_kb'] / 1024:.1f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento de Quirinux PDF Export")
+    parser.add_argument("--corpus-dir", default=default_corpus_dir(),
+                        help="carpeta del corpus generado")
+    parser.add_argument("--documents", nargs="+", choices=list(CORPUS), default=list(CORPUS),
+                        help="documentos del corpus a medir")
+    parser.add_argument("--formats", nargs="+", choices=engine.FORMATS, default=list(engine.FORMATS),
+                        help="formatos de salida a medir")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="ejecuciones por medida (se usa la más rápida)")
+    parser.add_argument("--baseline", default=default_baseline(),
+                        help="archivo JSON de referencia")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="guardar los resultados como nueva referencia")
+    parser.add_argument("--output", default=None,
+                        help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD,
+                        help="aumento de tiempo tolerado (fracción)")
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                        help="aumento de memoria tolerado (fracción)")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.corpus_dir, args.documents)
+    results = run_benchmark(corpus, args.formats, max(1, args.repeat))
+    data = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpus": os.cpu_count(),
+        "tools": deps.get_registry().toolchain_versions(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(data, out, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as out:
+            json.dump(data, out, ensure_ascii=False, indent=2)
+        print(f"Referencia guardada en {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except OSError:
+        print(f"No hay referencia en {args.baseline}; use --update-baseline para crearla")
+        return 0
+    if baseline.get("tools") != data["tools"]:
+        print("Aviso: las versiones de las herramientas difieren de las de la referencia")
+    regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f"REGRESIÓN  {regression}")
+    if not regressions:
+        print("Sin regresiones respecto a la referencia")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
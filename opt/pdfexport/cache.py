@@ -0,0 +1,251 @@
+"""Caché en disco de conversiones, direccionada por el contenido del PDF.
+
+Cada entrada se identifica por el hash del PDF, las opciones que afectan
+al resultado y las versiones de poppler/pandoc/LibreOffice. Se guardan
+los intermedios (texto extraído y páginas SVG) y los documentos finales;
+las entradas menos usadas recientemente se borran al superar el tamaño
+máximo.
+
+El tamaño y el último uso de cada entrada se llevan en un índice SQLite
+(index.sqlite), así que guardar una entrada no obliga a recorrer toda la
+caché. Si el índice no existe (caché de una versión anterior) o se
+borra, se reconstruye una vez a partir de las entradas.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Tamaño máximo por defecto de la caché
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+_HASH_CHUNK_SIZE = 1024 * 1024
+_META_FILE = "meta.json"
+_INDEX_FILE = "index.sqlite"
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+# Directorios temporales abandonados (p. ej. por un proceso terminado a la fuerza)
+_STALE_STAGING_SECONDS = 3600
+# Versión del formato de las entradas: subirla invalida las escritas antes
+# (p. ej. intermedios con SVG que dependían de otras páginas o páginas con
+# dibujos clasificadas como texto, o con fondo o subrayados clasificadas
+# como mixtas)
+_KEY_VERSION = 4
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pdfexport")
+
+
+def file_digest(path):
+    """Calcular el SHA-256 de un archivo leyéndolo por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ConversionCache:
+    """Almacén LRU de intermedios y resultados de conversión"""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES, tools=None):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        # Versiones de las herramientas externas (ver deps.Registry.toolchain_versions)
+        self.tools = tools or {}
+        self.entries_dir = os.path.join(self.root, "entries")
+        self._db = None
+        # La conversión por ventanas usa la caché desde varios hilos
+        self._lock = threading.Lock()
+
+    def key(self, pdf_digest, kind, options):
+        """Clave de una entrada: contenido del PDF + tipo + opciones + herramientas"""
+        material = json.dumps({
+            "version": _KEY_VERSION,
+            "pdf": pdf_digest,
+            "kind": kind,
+            "options": options,
+            "tools": self.tools,
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, key[:2], key)
+
+    def _index(self):
+        """Conexión al índice de tamaños y último uso (llamar con self._lock tomado)"""
+        if self._db is None:
+            os.makedirs(self.root, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.root, _INDEX_FILE), isolation_level=None, timeout=30,
+                                 check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            # El índice se puede reconstruir: no hace falta sincronizar cada escritura
+            db.execute("PRAGMA synchronous=NORMAL")
+            created = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries'").fetchone() is None
+            db.executescript(_INDEX_SCHEMA)
+            if created:
+                self._rebuild_index(db)
+            self._db = db
+        return self._db
+
+    def _rebuild_index(self, db):
+        """Indexar las entradas ya existentes; la fecha de modificación hace de último uso"""
+        rows = []
+        for path in self._entries():
+            try:
+                with open(os.path.join(path, _META_FILE), encoding="utf-8") as f:
+                    size = json.load(f).get("bytes", 0)
+                rows.append((os.path.basename(path), size, os.path.getmtime(path)))
+            except (OSError, ValueError):
+                continue
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR IGNORE INTO entries (key, bytes, used) VALUES (?, ?, ?)", rows)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _record(self, key, size=None):
+        """Anotar en el índice el uso de una entrada (y su tamaño al guardarla)"""
+        try:
+            with self._lock:
+                db = self._index()
+                if size is None:
+                    db.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+                else:
+                    db.execute("INSERT OR REPLACE INTO entries (key, bytes, used) VALUES (?, ?, ?)",
+                               (key, size, time.time()))
+        except sqlite3.Error:
+            # Sin índice la caché sigue funcionando; sólo se retrasa la limpieza
+            pass
+
+    def lookup(self, key):
+        """Devolver (ruta, metadatos) de una entrada existente o None; marca la entrada como usada"""
+        path = self._entry_path(key)
+        try:
+            with open(os.path.join(path, _META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._record(key)
+        return path, meta
+
+    def store(self, key, files, meta=None, evict=True):
+        """Guardar una entrada a partir de {nombre relativo: ruta de origen}.
+
+        La entrada se escribe en un directorio temporal y se publica con un
+        rename atómico, así varios procesos pueden compartir la caché. Al
+        guardar muchas entradas seguidas, evict=False y una sola llamada a
+        evict() al final evitan sumar los tamaños del índice cada vez.
+        """
+        os.makedirs(self.entries_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.entries_dir)
+        try:
+            for name, source in files.items():
+                target = os.path.join(staging, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(source, target)
+            meta = dict(meta or {})
+            meta["bytes"] = _tree_size(staging)
+            meta["files"] = sorted(files)
+            with open(os.path.join(staging, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            path = self._entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Otro proceso ya guardó la misma entrada
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._record(key, meta["bytes"])
+        if evict:
+            self.evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.entries_dir):
+            return
+        for prefix in os.listdir(self.entries_dir):
+            prefix_dir = os.path.join(self.entries_dir, prefix)
+            if prefix.startswith(".") or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                yield os.path.join(prefix_dir, key)
+
+    def _remove_stale_staging(self):
+        try:
+            names = os.listdir(self.entries_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.entries_dir, name)
+            try:
+                if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > _STALE_STAGING_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Borrar las entradas usadas hace más tiempo hasta quedar por debajo del tamaño máximo"""
+        self._remove_stale_staging()
+        try:
+            with self._lock:
+                db = self._index()
+                total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                removed = []
+                cursor = db.execute("SELECT key, bytes FROM entries ORDER BY used")
+                for key, size in cursor:
+                    removed.append((key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                cursor.close()
+                db.executemany("DELETE FROM entries WHERE key = ?", removed)
+        except sqlite3.Error:
+            return
+        for (key,) in removed:
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.entries_dir, ignore_errors=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(os.path.join(self.root, _INDEX_FILE + suffix))
+            except OSError:
+                pass
+
+
+def clear_cache(root=None):
+    ConversionCache(root).clear()
@@ -0,0 +1,171 @@
+"""Interfaz de línea de comandos de Quirinux PDF Export (sin interfaz gráfica)"""
+import argparse
+import os
+import sys
+
+import batch
+import cache
+import complexity
+import engine
+import jobqueue
+import server
+import watch
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pdfexport",
+        description="Convertir PDF en .odt, .doc y .docx sin interfaz gráfica",
+    )
+    parser.add_argument("--batch", metavar="DIR|GLOB",
+                        help="carpeta o patrón glob con los PDF a convertir")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="vigilar una carpeta y convertir los PDF que lleguen (modo servicio)")
+    parser.add_argument("--serve", action="store_true",
+                        help="atender conversiones por HTTP en localhost o en un socket Unix")
+    parser.add_argument("--format", choices=engine.FORMATS, action="append", dest="formats",
+                        help="formato de salida; se puede repetir para generar varios (por defecto: docx)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="número de procesos simultáneos (por defecto: núcleos disponibles)")
+    parser.add_argument("--out", default=None,
+                        help="carpeta de destino (por defecto: el escritorio del usuario)")
+    parser.add_argument("--svg-jobs", type=int, default=None,
+                        help="procesos pdftocairo simultáneos por documento")
+    parser.add_argument("--svg-chunk", type=int, default=engine.DEFAULT_SVG_CHUNK_SIZE,
+                        help=f"páginas por tarea de renderizado SVG (por defecto: {engine.DEFAULT_SVG_CHUNK_SIZE})")
+    parser.add_argument("--heavy-pages", choices=complexity.POLICIES, default="raster",
+                        help="qué hacer con las páginas SVG demasiado complejas (por defecto: raster)")
+    parser.add_argument("--max-svg-mb", type=float, default=complexity.DEFAULT_MAX_SVG_BYTES / (1024 * 1024),
+                        help="tamaño máximo de un SVG de página en MB")
+    parser.add_argument("--max-svg-elements", type=int, default=complexity.DEFAULT_MAX_SVG_ELEMENTS,
+                        help="número máximo de elementos de un SVG de página")
+    parser.add_argument("--raster-dpi", type=int, default=complexity.DEFAULT_RASTER_DPI,
+                        help="resolución de las páginas rasterizadas")
+    parser.add_argument("--raster-format", choices=complexity.RASTER_FORMATS, default="png",
+                        help="formato de las páginas rasterizadas")
+    parser.add_argument("--no-analysis", action="store_true",
+                        help="renderizar todas las páginas a SVG sin analizar antes su contenido")
+    parser.add_argument("--pandoc-text", action="store_true",
+                        help="generar el método de texto con pandoc en lugar del escritor ODT/DOCX integrado")
+    parser.add_argument("--window-pages", type=int, default=None,
+                        help="convertir los PDF largos por bloques de N páginas y unir el resultado "
+                             "(limita la memoria usada)")
+    parser.add_argument("--window-jobs", type=int, default=1,
+                        help="bloques de páginas convertidos a la vez (por defecto: 1)")
+    parser.add_argument("--tool-timeout", type=int, default=None,
+                        help="segundos máximos por llamada a una herramienta externa "
+                             "(por defecto: un límite propio para cada herramienta)")
+    parser.add_argument("--max-tool-cpu", type=int, default=None,
+                        help="segundos de CPU máximos por llamada a una herramienta externa")
+    parser.add_argument("--max-tool-memory-mb", type=int, default=None,
+                        help="memoria máxima (MB) de cada herramienta externa")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="no usar la caché de conversiones")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="vaciar la caché de conversiones")
+    parser.add_argument("--cache-max-mb", type=int, default=cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="tamaño máximo de la caché en MB")
+    parser.add_argument("--queue-db", default=None,
+                        help="base de datos de la cola de --watch (por defecto: .pdfexport-queue.sqlite "
+                             "en la carpeta de destino)")
+    parser.add_argument("--settle", type=float, default=watch.DEFAULT_SETTLE_SECONDS,
+                        help="segundos sin cambios para dar un archivo por terminado (--watch)")
+    parser.add_argument("--poll", type=float, default=watch.DEFAULT_POLL_SECONDS,
+                        help="intervalo de revisión de la carpeta si no hay inotify (--watch)")
+    parser.add_argument("--max-attempts", type=int, default=jobqueue.DEFAULT_MAX_ATTEMPTS,
+                        help="intentos por archivo antes de darlo por fallido (--watch)")
+    parser.add_argument("--host", default=server.DEFAULT_HOST,
+                        help="dirección en la que escucha --serve")
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT,
+                        help="puerto en el que escucha --serve")
+    parser.add_argument("--socket", default=None,
+                        help="escuchar en este socket Unix en lugar de un puerto TCP (--serve)")
+    parser.add_argument("--max-queue", type=int, default=server.DEFAULT_MAX_QUEUE,
+                        help="peticiones que pueden esperar turno antes de responder 503 (--serve)")
+    parser.add_argument("--max-upload-mb", type=int, default=server.DEFAULT_MAX_UPLOAD_MB,
+                        help="tamaño máximo de un PDF subido (--serve)")
+    parser.add_argument("--serve-paths", metavar="DIR", action="append", default=[],
+                        help="permitir convertir por ruta los PDF de esta carpeta; se puede repetir (--serve)")
+    parser.add_argument("--warm-office", action="store_true",
+                        help="arrancar LibreOffice al iniciar el servicio para que la primera conversión a DOC "
+                             "sea rápida (--serve)")
+    parser.add_argument("--office-instances", type=int, default=None,
+                        help="instancias de LibreOffice que pueden convertir a DOC a la vez "
+                             "(--serve; por defecto, tantas como --jobs)")
+    parser.add_argument("--trace-dir", default=None,
+                        help="carpeta donde guardar una traza JSON por archivo y el resumen trace-summary.json")
+    parser.add_argument("--summary", default=None,
+                        help="archivo JSON de resumen (por defecto: pdfexport-summary.json en la carpeta de destino)")
+    return parser
+
+
+def _print_result(summary):
+    if summary["ok"]:
+        outputs = ", ".join(output["output_path"] for output in summary["outputs"])
+        print(f"OK     {summary['pdf_file']} -> {outputs} ({summary['seconds']} s)")
+    else:
+        print(f"ERROR  {summary['pdf_file']}: {summary['error']}", file=sys.stderr)
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.clear_cache:
+        cache.clear_cache()
+        print(f"Caché vaciada: {cache.default_cache_dir()}")
+        if not (args.batch or args.watch or args.serve):
+            return 0
+    modes = [mode for mode in ("batch", "watch", "serve") if getattr(args, mode)]
+    if not modes:
+        parser.error("se necesita --batch, --watch o --serve")
+    if len(modes) > 1:
+        parser.error(" y ".join(f"--{mode}" for mode in modes) + " no se pueden usar a la vez")
+    output_dir = args.out or engine.default_output_dir()
+
+    options = engine.ConversionOptions(svg_jobs=args.svg_jobs, svg_chunk_size=args.svg_chunk,
+                                       use_cache=not args.no_cache,
+                                       cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                                       heavy_page_policy=args.heavy_pages,
+                                       max_svg_bytes=int(args.max_svg_mb * 1024 * 1024),
+                                       max_svg_elements=args.max_svg_elements,
+                                       raster_dpi=args.raster_dpi,
+                                       raster_format=args.raster_format,
+                                       analyze=not args.no_analysis,
+                                       native_text=not args.pandoc_text,
+                                       window_pages=args.window_pages,
+                                       window_jobs=args.window_jobs,
+                                       tool_timeout=args.tool_timeout,
+                                       max_tool_cpu_seconds=args.max_tool_cpu,
+                                       max_tool_memory_mb=args.max_tool_memory_mb,
+                                       trace_dir=args.trace_dir)
+    if args.serve:
+        server.run_server(args.host, args.port, args.socket, options=options, jobs=args.jobs,
+                          max_queue=args.max_queue, max_upload_bytes=args.max_upload_mb * 1024 * 1024,
+                          path_roots=args.serve_paths, warm_office=args.warm_office,
+                          office_instances=args.office_instances)
+        return 0
+    if args.watch:
+        watch.run_watch(args.watch, output_dir, args.formats or ["docx"], args.jobs, options,
+                        db_path=args.queue_db, settle=args.settle, poll=args.poll,
+                        max_attempts=args.max_attempts, on_result=_print_result)
+        return 0
+
+    pdf_files = batch.collect_pdfs(args.batch)
+    if not pdf_files:
+        print(f"No se encontraron archivos PDF en: {args.batch}", file=sys.stderr)
+        return 2
+    results = batch.run_batch(pdf_files, output_dir, args.formats or ["docx"], args.jobs,
+                              on_result=_print_result, options=options)
+    summary_path = args.summary or os.path.join(output_dir, "pdfexport-summary.json")
+    data = batch.write_summary(results, summary_path)
+    print(f"{data['ok']} de {data['total']} archivos convertidos. Resumen: {summary_path}")
+    if args.trace_dir:
+        trace_summary = os.path.join(args.trace_dir, "trace-summary.json")
+        batch.write_trace_summary(results, trace_summary)
+        print(f"Resumen de trazas: {trace_summary}")
+    return 0 if data["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Presupuesto de complejidad por página.
+
+Las páginas con cientos de miles de trazados vectoriales producen SVG de
+varios MB que pandoc tarda minutos en procesar. Cada SVG se mide (bytes y
+número de elementos) y, si supera el presupuesto, se sustituye por una
+imagen rasterizada de la página o se simplifica reduciendo la precisión
+de sus coordenadas.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import runner
+import tracing
+
+POLICIES = ("raster", "simplify", "keep")
+RASTER_FORMATS = ("png", "jpeg")
+
+DEFAULT_MAX_SVG_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_SVG_ELEMENTS = 50000
+DEFAULT_RASTER_DPI = 150
+# Decimales que se conservan en las coordenadas al simplificar
+DEFAULT_SIMPLIFY_PRECISION = 1
+
+_MEASURE_CHUNK_SIZE = 256 * 1024
+_RASTER_EXTENSIONS = {"png": ".png", "jpeg": ".jpg"}
+
+
+def measure_svg(svg_file):
+    """Devolver (bytes, elementos) de un SVG, leyéndolo por bloques"""
+    elements = 0
+    with open(svg_file, "rb") as svg_in:
+        for block in iter(lambda: svg_in.read(_MEASURE_CHUNK_SIZE), b""):
+            # Cada etiqueta de apertura abre un elemento; las de cierre no cuentan
+            elements += block.count(b"<") - block.count(b"</")
+    return os.path.getsize(svg_file), elements
+
+
+def is_heavy(svg_file, max_bytes, max_elements):
+    size, elements = measure_svg(svg_file)
+    return size > max_bytes or elements > max_elements
+
+
+def simplify_svg(svg_file, precision=DEFAULT_SIMPLIFY_PRECISION):
+    """Redondear las coordenadas del SVG a `precision` decimales, línea a línea"""
+    # Con menos de un decimal se alterarían valores como version="1.1"
+    precision = max(1, precision)
+    number = re.compile(rb"-?\d+\.\d{%d,}" % (precision + 1))
+    simplified = svg_file + ".tmp"
+
+    def round_match(match):
+        value = round(float(match.group(0)), precision)
+        return b"%.*f" % (precision, value)
+
+    with open(svg_file, "rb") as svg_in, open(simplified, "wb") as svg_out:
+        for line in svg_in:
+            svg_out.write(number.sub(round_match, line))
+    os.replace(simplified, svg_file)
+
+
+def rasterize_page(pdf_file, page, image_base, dpi=DEFAULT_RASTER_DPI, image_format="png"):
+    """Renderizar una página como imagen con pdftocairo; devuelve la ruta generada"""
+    image = image_base + _RASTER_EXTENSIONS[image_format]
+    runner.run(["pdftocairo", f"-{image_format}", "-r", str(dpi), "-singlefile",
+                "-f", str(page), "-l", str(page), pdf_file, image_base],
+               stage=f"pdftocairo-{image_format}", outputs=[image], page=page)
+    return image
+
+
+def _apply_to_page(pdf_file, page, svg_file, options):
+    if not is_heavy(svg_file, options.max_svg_bytes, options.max_svg_elements):
+        return svg_file
+    if options.heavy_page_policy == "simplify":
+        simplify_svg(svg_file, options.simplify_precision)
+        if not is_heavy(svg_file, options.max_svg_bytes, options.max_svg_elements):
+            return svg_file
+    # La simplificación no bastó (o la política es rasterizar)
+    image = rasterize_page(pdf_file, page, os.path.splitext(svg_file)[0],
+                           options.raster_dpi, options.raster_format)
+    os.remove(svg_file)
+    return image
+
+
+def apply_budget(pdf_file, svg_files, options, jobs=None, page_numbers=None):
+    """Sustituir o simplificar las páginas que superan el presupuesto.
+
+    svg_files está en orden de página (page_numbers indica sus números si
+    no son todas); devuelve la lista de imágenes de página (SVG o raster)
+    en el mismo orden.
+    """
+    if options.heavy_page_policy == "keep" or not svg_files:
+        return svg_files
+    page_numbers = page_numbers or range(1, len(svg_files) + 1)
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=min(jobs, len(svg_files))) as pool:
+        apply = tracing.wrap(lambda item: _apply_to_page(pdf_file, item[0], item[1], options))
+        return list(pool.map(apply, zip(page_numbers, svg_files)))
+
+
+def rasterize_pages(pdf_file, page_numbers, image_base, options, jobs=None):
+    """Rasterizar directamente las páginas indicadas; devuelve las imágenes en el mismo orden"""
+    if not page_numbers:
+        return []
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=min(jobs, len(page_numbers))) as pool:
+        def rasterize(page):
+            image = rasterize_page(pdf_file, page, f"{image_base}-{page:05d}", options.raster_dpi,
+                                   options.raster_format)
+            runner.advance()
+            return image
+
+        return list(pool.map(tracing.wrap(rasterize), page_numbers))
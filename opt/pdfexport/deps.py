@@ -0,0 +1,177 @@
+"""Registro de herramientas externas disponibles.
+
+Las rutas se resuelven al instante con una búsqueda en el PATH; las
+versiones se consultan en segundo plano y en paralelo, y se guardan en
+disco junto con la fecha de modificación del ejecutable para no volver a
+preguntarlas mientras el binario no cambie.
+"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+
+# Herramienta → (paquete Debian, argumentos para obtener la versión, imprescindible)
+TOOLS = {
+    "pdftotext": ("poppler-utils", ["-v"], True),
+    "pdftocairo": ("poppler-utils", ["-v"], True),
+    "pdfinfo": ("poppler-utils", ["-v"], True),
+    "pdfimages": ("poppler-utils", ["-v"], False),
+    "pandoc": ("pandoc", ["--version"], True),
+    "convert": ("imagemagick", ["--version"], False),
+    "gs": ("ghostscript", ["--version"], False),
+    "libreoffice": ("libreoffice", ["--version"], False),
+    "soffice": ("libreoffice", ["--version"], False),
+    "unoconv": ("unoconv", ["--version"], False),
+}
+
+# Segundos máximos que puede tardar una consulta de versión
+PROBE_TIMEOUT = 30
+
+
+def _registry_file():
+    return os.path.join(cache.default_cache_dir(), "capabilities.json")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Registry:
+    """Rutas y versiones de las herramientas externas"""
+
+    def __init__(self, registry_file=None):
+        self.registry_file = registry_file or _registry_file()
+        self._paths = {}
+        self._versions = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._stored = self._load()
+
+    def _load(self):
+        try:
+            with open(self.registry_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        with self._lock:
+            data = dict(self._stored)
+        try:
+            os.makedirs(os.path.dirname(self.registry_file), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.registry_file), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.registry_file)
+        except OSError:
+            pass
+
+    def path(self, name):
+        """Ruta del ejecutable o None si no está instalado"""
+        with self._lock:
+            if name not in self._paths:
+                self._paths[name] = shutil.which(name)
+            return self._paths[name]
+
+    def available(self, name):
+        return self.path(name) is not None
+
+    def _stored_version(self, name, path):
+        entry = self._stored.get(name)
+        if entry and entry.get("path") == path and entry.get("mtime") == _mtime(path):
+            return entry.get("version")
+        return None
+
+    def _probe(self, name, path):
+        args = TOOLS[name][1]
+        try:
+            result = subprocess.run([path] + args, capture_output=True, text=True,
+                                    check=False, timeout=PROBE_TIMEOUT)
+            # Algunas herramientas (pdftotext) escriben la versión en stderr
+            output = (result.stdout or result.stderr).strip()
+            version = output.splitlines()[0] if output else ""
+        except (OSError, subprocess.TimeoutExpired):
+            version = ""
+        with self._lock:
+            self._versions[name] = version
+            self._stored[name] = {"path": path, "mtime": _mtime(path), "version": version}
+        return version
+
+    def start_probes(self, names=None):
+        """Consultar en segundo plano las versiones que no estén ya guardadas"""
+        pending = []
+        for name in names or TOOLS:
+            path = self.path(name)
+            with self._lock:
+                if name in self._versions or name in self._futures:
+                    continue
+                if path is None:
+                    self._versions[name] = None
+                    continue
+                stored = self._stored_version(name, path)
+                if stored is not None:
+                    self._versions[name] = stored
+                    continue
+            pending.append((name, path))
+        if not pending:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=len(pending))
+        with self._lock:
+            for name, path in pending:
+                self._futures[name] = executor.submit(self._probe, name, path)
+        futures = [self._futures[name] for name, _ in pending]
+
+        def persist():
+            for future in futures:
+                future.exception()
+            executor.shutdown(wait=False)
+            self._save()
+
+        threading.Thread(target=persist, daemon=True).start()
+
+    def version(self, name):
+        """Versión de la herramienta (espera a su consulta si aún está en curso)"""
+        self.start_probes([name])
+        with self._lock:
+            if name in self._versions:
+                return self._versions[name]
+            future = self._futures[name]
+        return future.result()
+
+    def missing(self, required=True):
+        """Paquetes Debian que faltan, imprescindibles u opcionales"""
+        packages = []
+        for name, (package, _, is_required) in TOOLS.items():
+            if is_required == required and not self.available(name) and package not in packages:
+                packages.append(package)
+        return packages
+
+    def toolchain_versions(self):
+        """Versiones que determinan el resultado de una conversión"""
+        return {
+            "poppler": self.version("pdftotext"),
+            "pandoc": self.version("pandoc"),
+            "libreoffice": self.version("soffice") or self.version("libreoffice"),
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registro compartido del proceso"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry()
+        return _registry
@@ -0,0 +1,345 @@
+"""Representación intermedia de un PDF y escritores que la consumen.
+
+El PDF se extrae una sola vez (texto por página y gráfico renderizado de
+cada página, en SVG o raster) y todos los métodos de conversión parten de esta estructura,
+de modo que un método alternativo sólo repite el paso final de escritura.
+"""
+import html
+import os
+import re
+import shutil
+import zipfile
+from xml.sax.saxutils import escape
+
+# Tamaño de bloque para copiar SVG al HTML sin cargarlos enteros en memoria
+COPY_CHUNK_SIZE = 64 * 1024
+# Máximo de bytes que se examinan buscando el prólogo XML/DOCTYPE de un SVG
+_PROLOG_LIMIT = 4096
+
+_HTML_HEAD = (
+    "<!DOCTYPE html>\n<html>\n<head>\n"
+    "<meta charset='utf-8'>\n"
+    "<style>\n"
+    "body { font-family: Arial, sans-serif; }\n"
+    ".page { page-break-after: always; margin-bottom: 20px; }\n"
+    ".svg-container { max-width: 100%; }\n"
+    "</style>\n</head>\n<body>\n"
+)
+
+# Salto de página para DOCX; los demás escritores de pandoc ignoran este bloque
+_MARKDOWN_PAGE_BREAK = '\n```{=openxml}\n<w:p><w:r><w:br w:type="page"/></w:r></w:p>\n```\n\n'
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]<>#|~^$@])")
+_MARKDOWN_LINE_START = re.compile(r"^(\d+)([.)])|^([-+=:>])")
+
+# Valores por defecto de los escritores nativos si el análisis no midió el PDF (A4, 11 pt)
+DEFAULT_PAGE_SIZE = (595.3, 841.9)
+DEFAULT_FONT_SIZE = 11
+_FONT_FAMILY = "Arial"
+# Márgenes de página en puntos (2 cm)
+_PAGE_MARGIN = 56.7
+# Caracteres que XML 1.0 no admite (pdftotext puede emitir algunos de control)
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_ODT_SPACES = re.compile("  +")
+
+_DOCX_FILES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="word/document.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    "word/_rels/document.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'),
+}
+_DOCX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:docDefaults><w:rPrDefault><w:rPr>'
+    '<w:rFonts w:ascii="{font}" w:hAnsi="{font}" w:eastAsia="{font}" w:cs="{font}"/>'
+    '<w:sz w:val="{half_points}"/><w:szCs w:val="{half_points}"/>'
+    '</w:rPr></w:rPrDefault>'
+    '<w:pPrDefault><w:pPr><w:spacing w:after="120"/></w:pPr></w:pPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+    '</w:styles>'
+)
+_DOCX_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><w:body>'
+)
+_DOCX_SECTION = (
+    '<w:sectPr><w:pgSz w:w="{width}" w:h="{height}"{orient}/>'
+    '<w:pgMar w:top="{margin}" w:right="{margin}" w:bottom="{margin}" w:left="{margin}" '
+    'w:header="709" w:footer="709" w:gutter="0"/></w:sectPr></w:body></w:document>'
+)
+_DOCX_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+_ODT_MIMETYPE = "application/vnd.oasis.opendocument.text"
+_ODT_NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0" office:version="1.2"'
+)
+_ODT_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" '
+    'manifest:version="1.2">'
+    f'<manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="{_ODT_MIMETYPE}"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '<manifest:file-entry manifest:full-path="styles.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+_ODT_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    f'<office:document-styles {_ODT_NAMESPACES}><office:styles>'
+    '<style:default-style style:family="paragraph">'
+    '<style:paragraph-properties fo:margin-top="0pt" fo:margin-bottom="6pt"/>'
+    '<style:text-properties fo:font-family="{font}" fo:font-size="{font_size}pt"/></style:default-style>'
+    '<style:style style:name="Standard" style:family="paragraph" style:class="text"/>'
+    '</office:styles><office:automatic-styles>'
+    '<style:page-layout style:name="pm1"><style:page-layout-properties fo:page-width="{width}pt" '
+    'fo:page-height="{height}pt" style:print-orientation="{orientation}" fo:margin-top="{margin}pt" '
+    'fo:margin-bottom="{margin}pt" fo:margin-left="{margin}pt" fo:margin-right="{margin}pt"/>'
+    '</style:page-layout></office:automatic-styles><office:master-styles>'
+    '<style:master-page style:name="Standard" style:page-layout-name="pm1"/>'
+    '</office:master-styles></office:document-styles>'
+)
+_ODT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    f'<office:document-content {_ODT_NAMESPACES}><office:automatic-styles>'
+    '<style:style style:name="Salto" style:family="paragraph" style:parent-style-name="Standard">'
+    '<style:paragraph-properties fo:break-before="page"/></style:style>'
+    '</office:automatic-styles><office:body><office:text>'
+)
+_ODT_TAIL = '</office:text></office:body></office:document-content>'
+_ODT_PAGE_BREAK = '<text:p text:style-name="Salto"/>'
+
+
+class Page:
+    """Una página: párrafos de texto (listas de líneas) y su gráfico renderizado"""
+
+    def __init__(self, number, paragraphs, image=None):
+        self.number = number
+        self.paragraphs = paragraphs
+        # Ruta del SVG o de la imagen raster de la página (None si no se pudo renderizar)
+        self.image = image
+
+    @property
+    def is_raster(self):
+        return bool(self.image) and not self.image.endswith(".svg")
+
+    @property
+    def has_text(self):
+        return bool(self.paragraphs)
+
+
+class Document:
+    """Contenido extraído de un PDF, página a página"""
+
+    def __init__(self, pdf_file, pages, page_size=None, font_size=None):
+        self.pdf_file = pdf_file
+        self.pages = pages
+        # Medidas del PDF según analysis.measure (None si no se analizó): puntos
+        self.page_size = page_size
+        self.font_size = font_size
+
+    @property
+    def has_text(self):
+        return any(page.has_text for page in self.pages)
+
+    @property
+    def has_images(self):
+        return any(page.image for page in self.pages)
+
+
+def _split_paragraphs(lines):
+    """Separar las líneas de una página en párrafos delimitados por líneas en blanco"""
+    paragraphs = []
+    current = []
+    for line in lines:
+        if line.strip():
+            current.append(line.rstrip())
+        elif current:
+            paragraphs.append(current)
+            current = []
+    if current:
+        paragraphs.append(current)
+    return paragraphs
+
+
+def parse_text(text_file, page_count=None):
+    """Leer la salida de pdftotext (páginas separadas por \\f) como lista de párrafos por página"""
+    pages = []
+    lines = []
+    with open(text_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split("\f")
+            lines.append(parts[0])
+            for part in parts[1:]:
+                pages.append(_split_paragraphs(lines))
+                lines = [part]
+    # pdftotext termina cada página con \f, así que el último trozo suele estar vacío
+    if any(line.strip() for line in lines):
+        pages.append(_split_paragraphs(lines))
+    if page_count is not None:
+        pages += [[] for _ in range(page_count - len(pages))]
+    return pages
+
+
+def _skip_prolog(svg_in):
+    """Avanzar svg_in más allá de las declaraciones <?xml ...?> y <!DOCTYPE ...>.
+
+    Devuelve los bytes ya leídos que pertenecen al contenido y deben copiarse.
+    """
+    head = svg_in.read(_PROLOG_LIMIT)
+    pos = 0
+    while True:
+        # Saltar espacios entre declaraciones
+        while pos < len(head) and head[pos:pos + 1].isspace():
+            pos += 1
+        if head.startswith(b"<?", pos):
+            end = head.find(b"?>", pos)
+            if end < 0:
+                break
+            pos = end + 2
+        elif head.startswith(b"<!DOCTYPE", pos):
+            end = head.find(b">", pos)
+            if end < 0:
+                break
+            pos = end + 1
+        else:
+            break
+    return head[pos:]
+
+
+def _copy_svg(svg_file, html_out):
+    """Copiar un SVG al HTML por bloques, sin su prólogo XML"""
+    with open(svg_file, 'rb') as svg_in:
+        html_out.write(_skip_prolog(svg_in))
+        shutil.copyfileobj(svg_in, html_out, COPY_CHUNK_SIZE)
+
+
+def write_html(document, html_file, with_images=True):
+    """Escribir el documento como HTML: gráficos de página incrustados o, si no hay, el texto.
+
+    El HTML se escribe en streaming: la memoria usada no depende del número de páginas.
+    """
+    with open(html_file, 'wb') as html_out:
+        html_out.write(_HTML_HEAD.encode('utf-8'))
+        for page in document.pages:
+            if with_images and page.is_raster:
+                # pandoc incrusta la imagen a partir de su ruta local
+                src = html.escape(os.path.abspath(page.image))
+                html_out.write(f"<div class='page'>\n<img src='{src}' alt='' style='width:100%'>\n</div>\n"
+                               .encode('utf-8'))
+            elif with_images and page.image:
+                html_out.write(b"<div class='page'>\n<div class='svg-container'>\n")
+                _copy_svg(page.image, html_out)
+                html_out.write(b"</div>\n</div>\n")
+            else:
+                html_out.write(b"<div class='page'>\n")
+                for lines in page.paragraphs:
+                    para = "<br>".join(html.escape(line.strip(), quote=False) for line in lines)
+                    html_out.write(f"<p>{para}</p>\n".encode('utf-8'))
+                html_out.write(b"</div>\n")
+        html_out.write(b"</body>\n</html>")
+
+
+def _markdown_line(line):
+    # Las sangrías de -layout se convertirían en bloques de código
+    line = _MARKDOWN_SPECIAL.sub(r"\\\1", line.strip())
+    return _MARKDOWN_LINE_START.sub(lambda m: m.group(0)[:-1] + "\\" + m.group(0)[-1], line)
+
+
+def write_markdown(document, markdown_file):
+    """Escribir el texto del documento como Markdown de pandoc, conservando líneas y páginas"""
+    with open(markdown_file, "w", encoding="utf-8") as md_out:
+        for index, page in enumerate(document.pages):
+            if index:
+                md_out.write(_MARKDOWN_PAGE_BREAK)
+            for lines in page.paragraphs:
+                # Barra invertida al final de línea = salto de línea forzado
+                md_out.write("\\\n".join(_markdown_line(line) for line in lines))
+                md_out.write("\n\n")
+
+
+def _xml_text(line):
+    return escape(_XML_INVALID.sub("", line.strip()))
+
+
+def _page_geometry(document):
+    width, height = document.page_size or DEFAULT_PAGE_SIZE
+    return width, height, document.font_size or DEFAULT_FONT_SIZE
+
+
+def write_docx(document, docx_file):
+    """Escribir el texto del documento como DOCX mínimo, sin pandoc.
+
+    Conserva párrafos, saltos de línea y de página, el tamaño de página y
+    el tamaño de letra medidos en el PDF. document.xml se escribe en
+    streaming, página a página.
+    """
+    width, height, font_size = _page_geometry(document)
+    with zipfile.ZipFile(docx_file, "w", zipfile.ZIP_DEFLATED) as docx:
+        for name, data in _DOCX_FILES.items():
+            docx.writestr(name, data)
+        docx.writestr("word/styles.xml", _DOCX_STYLES.format(font=_FONT_FAMILY, half_points=round(font_size * 2)))
+        with docx.open("word/document.xml", "w") as doc_out:
+            doc_out.write(_DOCX_HEAD.encode("utf-8"))
+            for index, page in enumerate(document.pages):
+                if index:
+                    doc_out.write(_DOCX_PAGE_BREAK.encode("utf-8"))
+                for lines in page.paragraphs:
+                    runs = "<w:br/>".join(f'<w:t xml:space="preserve">{_xml_text(line)}</w:t>' for line in lines)
+                    doc_out.write(f"<w:p><w:r>{runs}</w:r></w:p>".encode("utf-8"))
+            # Medidas de página en vigésimos de punto
+            doc_out.write(_DOCX_SECTION.format(
+                width=round(width * 20), height=round(height * 20), margin=round(_PAGE_MARGIN * 20),
+                orient=' w:orient="landscape"' if width > height else "").encode("utf-8"))
+    return docx_file
+
+
+def _odt_line(line):
+    # ODT reduce los espacios seguidos a uno salvo que se marquen con <text:s/>
+    return _ODT_SPACES.sub(lambda m: f' <text:s text:c="{len(m.group(0)) - 1}"/>', _xml_text(line))
+
+
+def write_odt(document, odt_file):
+    """Escribir el texto del documento como ODT mínimo, sin pandoc (ver write_docx)"""
+    width, height, font_size = _page_geometry(document)
+    with zipfile.ZipFile(odt_file, "w", zipfile.ZIP_DEFLATED) as odt:
+        # mimetype debe ser la primera entrada y sin comprimir
+        odt.writestr(zipfile.ZipInfo("mimetype"), _ODT_MIMETYPE, zipfile.ZIP_STORED)
+        odt.writestr("META-INF/manifest.xml", _ODT_MANIFEST)
+        odt.writestr("styles.xml", _ODT_STYLES.format(
+            font=_FONT_FAMILY, font_size=f"{font_size:g}", width=width, height=height, margin=_PAGE_MARGIN,
+            orientation="landscape" if width > height else "portrait"))
+        with odt.open("content.xml", "w") as content_out:
+            content_out.write(_ODT_HEAD.encode("utf-8"))
+            for index, page in enumerate(document.pages):
+                if index:
+                    content_out.write(_ODT_PAGE_BREAK.encode("utf-8"))
+                for lines in page.paragraphs:
+                    text = "<text:line-break/>".join(_odt_line(line) for line in lines)
+                    content_out.write(f'<text:p text:style-name="Standard">{text}</text:p>'.encode("utf-8"))
+            content_out.write(_ODT_TAIL.encode("utf-8"))
+    return odt_file
+
+
+# Escritores nativos por formato
+NATIVE_WRITERS = {"docx": write_docx, "odt": write_odt}
@@ -0,0 +1,899 @@
+"""Motor de conversión PDF → ODT/DOC/DOCX sin dependencias de la interfaz gráfica"""
+import copy
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import analysis
+import cache
+import complexity
+import deps
+import document
+import fingerprint
+import merge
+import office
+import runner
+import tracing
+
+FORMATS = ("odt", "doc", "docx")
+
+# Páginas que renderiza cada tarea del pool de SVG
+DEFAULT_SVG_CHUNK_SIZE = 8
+
+
+
+class ConversionError(Exception):
+    """Error que impide generar el documento de salida"""
+
+
+class ConversionCancelled(ConversionError):
+    """El usuario canceló la conversión"""
+
+
+class ConversionResult:
+    """Resultado de convertir un PDF (serializable para el pool de procesos)"""
+
+    def __init__(self, pdf_file, output_path, method, cached=False):
+        self.pdf_file = pdf_file
+        self.output_path = output_path
+        self.method = method
+        self.cached = cached
+        # Herramientas externas lanzadas durante la conversión
+        self.subprocesses = 0
+        # Traza JSON de la conversión (si se pidió)
+        self.trace_file = None
+
+    def as_dict(self):
+        return {
+            "pdf_file": self.pdf_file,
+            "output_path": self.output_path,
+            "method": self.method,
+            "cached": self.cached,
+            "subprocesses": self.subprocesses,
+            "trace_file": self.trace_file,
+        }
+
+
+class ConversionOptions:
+    """Parámetros ajustables del proceso de conversión"""
+
+    # Opciones que cambian el documento generado (forman parte de la clave de caché)
+    OUTPUT_OPTIONS = ("heavy_page_policy", "max_svg_bytes", "max_svg_elements",
+                      "raster_dpi", "raster_format", "simplify_precision", "analyze", "window_pages",
+                      "native_text")
+
+    def __init__(self, svg_jobs=None, svg_chunk_size=DEFAULT_SVG_CHUNK_SIZE,
+                 use_cache=True, cache_max_bytes=cache.DEFAULT_MAX_BYTES,
+                 heavy_page_policy="raster",
+                 max_svg_bytes=complexity.DEFAULT_MAX_SVG_BYTES,
+                 max_svg_elements=complexity.DEFAULT_MAX_SVG_ELEMENTS,
+                 raster_dpi=complexity.DEFAULT_RASTER_DPI, raster_format="png",
+                 simplify_precision=complexity.DEFAULT_SIMPLIFY_PRECISION,
+                 analyze=True, window_pages=None, window_jobs=1, tool_timeout=None,
+                 max_tool_cpu_seconds=None, max_tool_memory_mb=None, trace_dir=None, native_text=True):
+        # Número de procesos pdftocairo simultáneos (por defecto: núcleos disponibles)
+        self.svg_jobs = svg_jobs
+        self.svg_chunk_size = svg_chunk_size
+        self.use_cache = use_cache
+        self.cache_max_bytes = cache_max_bytes
+        # Qué hacer con las páginas que superan el presupuesto de complejidad
+        # ("raster", "simplify" o "keep"; ver complexity.py)
+        self.heavy_page_policy = heavy_page_policy
+        self.max_svg_bytes = max_svg_bytes
+        self.max_svg_elements = max_svg_elements
+        self.raster_dpi = raster_dpi
+        self.raster_format = raster_format
+        self.simplify_precision = simplify_precision
+        # Analizar cada página antes de renderizarla para elegir el método más barato
+        # (ver analysis.py); sin análisis todas las páginas se renderizan a SVG
+        self.analyze = analyze
+        # Convertir por ventanas de este número de páginas y unir el resultado
+        # (None: el documento entero de una vez); window_jobs ventanas a la vez
+        self.window_pages = window_pages
+        self.window_jobs = window_jobs
+        # Tiempo máximo de cada llamada a una herramienta (None: el de cada
+        # herramienta en runner.DEFAULT_TIMEOUTS) y límites de CPU y memoria
+        self.tool_timeout = tool_timeout
+        self.max_tool_cpu_seconds = max_tool_cpu_seconds
+        self.max_tool_memory_mb = max_tool_memory_mb
+        # Carpeta donde guardar una traza JSON por trabajo (None: sin trazas)
+        self.trace_dir = trace_dir
+        # Escribir el método de texto directamente en ODT/DOCX (document.py) en
+        # lugar de pasar por Markdown y pandoc
+        self.native_text = native_text
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def output_options(self):
+        return {name: getattr(self, name) for name in self.OUTPUT_OPTIONS}
+
+    def for_jobs(self, jobs):
+        """Copia de las opciones para `jobs` conversiones simultáneas.
+
+        Si svg_jobs no está fijado, los núcleos se reparten entre las
+        conversiones para no sobresuscribir la CPU.
+        """
+        options = copy.copy(self)
+        if options.svg_jobs is None:
+            options.svg_jobs = max(1, (os.cpu_count() or 1) // max(1, jobs))
+        return options
+
+
+def default_output_dir():
+    """Obtener la ruta del escritorio del usuario (o su carpeta personal)"""
+    try:
+        desktop_path = str(Path.home() / "Desktop")
+        if not os.path.exists(desktop_path):
+            # Intentar con la versión en español
+            desktop_path = str(Path.home() / "Escritorio")
+            if not os.path.exists(desktop_path):
+                desktop_path = str(Path.home())
+        return desktop_path
+    except Exception as e:
+        print(f"Error al obtener ruta del escritorio: {str(e)}")
+        return os.path.expanduser("~")
+
+
+def _notify(progress, message):
+    if progress is not None:
+        progress(message)
+
+
+def page_count(pdf_file):
+    """Obtener el número de páginas del PDF con pdfinfo"""
+    result = runner.run(["pdfinfo", pdf_file])
+    for line in result.stdout.splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split(":", 1)[1])
+    raise ConversionError("pdfinfo no informó el número de páginas")
+
+
+def _render_svg_range(pdf_file, svg_base, page_numbers):
+    """Renderizar las páginas indicadas, una llamada a pdftocairo por página"""
+    paths = []
+    for page in page_numbers:
+        svg_path = f"{svg_base}-{page:05d}.svg"
+        runner.run(["pdftocairo", "-svg", "-f", str(page), "-l", str(page), pdf_file, svg_path],
+                   stage="pdftocairo-svg", outputs=[svg_path], page=page)
+        runner.advance()
+        paths.append(svg_path)
+    return paths
+
+
+def render_svg_pages(pdf_file, svg_dir, file_name, jobs=None, chunk_size=DEFAULT_SVG_CHUNK_SIZE, pages=None,
+                     page_numbers=None):
+    """Renderizar las páginas a SVG repartiendo rangos de páginas entre varios procesos.
+
+    Sin page_numbers se renderizan todas. Devuelve la lista de archivos
+    SVG en orden de página.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, (pages or page_count(pdf_file)) + 1)
+    page_numbers = list(page_numbers)
+    chunk_size = max(1, chunk_size)
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    svg_base = os.path.join(svg_dir, file_name)
+    ranges = [page_numbers[start:start + chunk_size] for start in range(0, len(page_numbers), chunk_size)]
+
+    if jobs == 1 or len(ranges) <= 1:
+        chunks = [_render_svg_range(pdf_file, svg_base, numbers) for numbers in ranges]
+    else:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(ranges))) as pool:
+            chunks = list(pool.map(tracing.wrap(lambda numbers: _render_svg_range(pdf_file, svg_base, numbers)),
+                                   ranges))
+    return [path for chunk in chunks for path in chunk]
+
+
+def _docx_to_doc(docx_temp, output_doc, progress=None):
+    """Convertir un DOCX a DOC con LibreOffice o unoconv; si no es posible se entrega el DOCX"""
+    # Usar una instancia persistente de LibreOffice (sin arrancarla por cada documento)
+    try:
+        with tracing.stage("office-doc", [docx_temp], [output_doc]):
+            office.get_pool().convert(docx_temp, output_doc, "doc")
+        return output_doc
+    except office.OfficeError:
+        pass
+
+    # Si no está LibreOffice, intentar con unoconv
+    if deps.get_registry().available("unoconv"):
+        try:
+            runner.run(["unoconv", "-f", "doc", "-o", output_doc, docx_temp],
+                       inputs=[docx_temp], outputs=[output_doc])
+            return output_doc
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            pass
+
+    # Si también falla, copiamos el DOCX (última opción)
+    _notify(progress, "No se puede convertir directamente a DOC. Generando DOCX en su lugar...")
+    fallback = os.path.splitext(output_doc)[0] + ".docx"
+    # Si también se pidió DOCX, el archivo ya está en su sitio
+    if os.path.abspath(fallback) != os.path.abspath(docx_temp):
+        shutil.copy2(docx_temp, fallback)
+    _notify(progress, "Se ha generado un archivo DOCX en lugar de DOC")
+    return fallback
+
+
+def _pandoc(source_file, source_format, target, target_format, toc):
+    extra = ["--standalone", "--toc"] if toc else []
+    runner.run(["pandoc", "-f", source_format, "-t", target_format] + extra + ["-o", target, source_file],
+               stage=f"pandoc-{source_format}-{target_format}", inputs=[source_file], outputs=[target])
+    return target
+
+
+def _write_outputs(source_file, source_format, output_docs, temp_dir, progress=None, toc=True):
+    """Escribir a la vez todos los formatos pedidos a partir de un documento intermedio.
+
+    output_docs asocia cada formato con su ruta de destino. Los escritores
+    de pandoc se ejecutan en paralelo y el DOC se obtiene del DOCX ya
+    generado. Devuelve {formato: ruta generada} sólo con los que funcionaron.
+    """
+    targets = _write_targets(output_docs, temp_dir)
+    produced = {}
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = {fmt: pool.submit(tracing.wrap(_pandoc), source_file, source_format, path, fmt, toc)
+                   for fmt, path in targets.items()}
+        for fmt, future in futures.items():
+            try:
+                produced[fmt] = future.result()
+            except (OSError, subprocess.CalledProcessError) as e:
+                _notify(progress, f"No se pudo generar {fmt.upper()}: {str(e)}")
+    return _collect_outputs(produced, output_docs, progress)
+
+
+def _write_native(doc, output_docs, temp_dir, progress=None):
+    """Escribir el texto del documento directamente en ODT/DOCX, sin lanzar pandoc.
+
+    Como _write_outputs, devuelve {formato: ruta generada}; el DOC se
+    obtiene del DOCX.
+    """
+    produced = {}
+    for fmt, path in _write_targets(output_docs, temp_dir).items():
+        try:
+            with tracing.stage(f"native-{fmt}", outputs=[path]):
+                produced[fmt] = document.NATIVE_WRITERS[fmt](doc, path)
+        except OSError as e:
+            _notify(progress, f"No se pudo generar {fmt.upper()}: {str(e)}")
+    return _collect_outputs(produced, output_docs, progress)
+
+
+def _write_targets(output_docs, temp_dir):
+    """Formatos que hay que escribir y dónde: ODT y DOCX (para DOC, un DOCX temporal)"""
+    targets = {fmt: path for fmt, path in output_docs.items() if fmt in ("odt", "docx")}
+    if "doc" in output_docs and "docx" not in targets:
+        # Para DOC, primero convertimos a DOCX
+        file_name = os.path.splitext(os.path.basename(output_docs["doc"]))[0]
+        targets["docx"] = os.path.join(temp_dir, f"{file_name}.docx")
+    return targets
+
+
+def _collect_outputs(produced, output_docs, progress):
+    results = {fmt: path for fmt, path in produced.items() if fmt in output_docs and _has_content(path)}
+    if "doc" in output_docs and _has_content(produced.get("docx", "")):
+        results["doc"] = _docx_to_doc(produced["docx"], output_docs["doc"], progress)
+    return results
+
+
+def _has_content(path):
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def _restore_output(conversion_cache, output_key, output_doc, pdf_file):
+    """Copiar un resultado guardado en la caché; devuelve None si no hay entrada válida"""
+    entry = conversion_cache.lookup(output_key)
+    if entry is None:
+        return None
+    path, meta = entry
+    target = os.path.splitext(output_doc)[0] + meta["extension"]
+    try:
+        shutil.copyfile(os.path.join(path, "output" + meta["extension"]), target)
+    except OSError:
+        # La entrada pudo borrarse mientras se leía
+        return None
+    return ConversionResult(pdf_file, target, meta["method"], cached=True)
+
+
+def _restore_parts(conversion_cache, part_keys, parts_dir, index):
+    """Copiar de la caché las partes ya convertidas de una ventana; None si falta alguna"""
+    parts = {}
+    method = None
+    for fmt, key in part_keys.items():
+        entry = conversion_cache.lookup(key)
+        if entry is None:
+            return None
+        path, meta = entry
+        parts[fmt] = os.path.join(parts_dir, f"{index:05d}.{fmt}")
+        try:
+            with tracing.stage("cache-restore", outputs=[parts[fmt]]):
+                shutil.copyfile(os.path.join(path, "part." + fmt), parts[fmt])
+            method = meta["method"]
+        except (OSError, KeyError):
+            return None
+    return parts, method
+
+
+def _page_range_args(window):
+    return ["-f", str(window[0]), "-l", str(window[1])] if window else []
+
+
+def _extract_text(pdf_file, text_file, progress=None, window=None):
+    """Extraer el texto del PDF, con saltos de página, para la representación intermedia"""
+    pages = _page_range_args(window)
+    runner.run(["pdftotext", "-layout"] + pages + [pdf_file, text_file], inputs=[pdf_file], outputs=[text_file])
+    # Verificar que se extrajo contenido
+    if os.path.getsize(text_file) == 0:
+        _notify(progress, "No se pudo extraer texto del PDF. Probando método alternativo...")
+        runner.run(["pdftotext"] + pages + [pdf_file, text_file], inputs=[pdf_file], outputs=[text_file])
+
+
+def _extract_document(pdf_file, temp_dir, file_name, options, progress, conversion_cache, intermediate_key,
+                      window=None, fingerprints=None):
+    """Extraer una sola vez el texto y las páginas SVG del PDF (o recuperarlos de la caché).
+
+    window = (primera, última) limita la extracción a esas páginas. Con la
+    huella de cada página (fingerprint.py) la caché se consulta página a
+    página y sólo se extraen las que no están en ella.
+    """
+    first = window[0] if window else 1
+    if conversion_cache and fingerprints:
+        return _extract_pages(pdf_file, temp_dir, file_name, options, progress, conversion_cache,
+                              first, fingerprints)
+    text_file = os.path.join(temp_dir, f"{file_name}.txt")
+    svg_dir = os.path.join(temp_dir, "svg")
+    os.makedirs(svg_dir, exist_ok=True)
+
+    entry = conversion_cache.lookup(intermediate_key) if conversion_cache else None
+    if entry is not None:
+        path, meta = entry
+        try:
+            with tracing.stage("cache-restore", outputs=[text_file]):
+                shutil.copyfile(os.path.join(path, "text.txt"), text_file)
+                images = []
+                for name in meta["pages"]:
+                    # Las páginas de texto no tienen imagen
+                    images.append(name and os.path.join(svg_dir, os.path.basename(name)))
+                    if name:
+                        shutil.copyfile(os.path.join(path, name), images[-1])
+            runner.advance(len(images))
+            return _build_document(pdf_file, text_file, images, first, meta.get("layout"))
+        except (OSError, KeyError):
+            pass
+
+    _notify(progress, "Extrayendo texto del PDF...")
+    try:
+        _extract_text(pdf_file, text_file, progress, window)
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        raise ConversionError(f"No se pudo extraer el texto del PDF: {str(e)}") from e
+
+    try:
+        last = window[1] if window else page_count(pdf_file)
+        kinds, infos = _classify_pages(pdf_file, temp_dir, first, last, options, progress)
+        rendered = _render_pages(pdf_file, svg_dir, file_name, dict(enumerate(kinds, start=first)),
+                                 options, progress)
+        images = [rendered[number] for number in range(first, last + 1)]
+        layout = analysis.measure(infos)
+    except (FileNotFoundError, subprocess.CalledProcessError, ConversionError) as e:
+        _notify(progress, f"Método SVG falló, probando método alternativo... {str(e)}")
+        images = []
+        layout = {}
+
+    if conversion_cache:
+        files = {"text.txt": text_file}
+        names = []
+        for image in images:
+            name = image and "pages/" + os.path.basename(image)
+            if name:
+                files[name] = image
+            names.append(name)
+        try:
+            with tracing.stage("cache-store", list(files.values())):
+                conversion_cache.store(intermediate_key, files, {"pages": names, "layout": layout})
+        except OSError:
+            pass
+    return _build_document(pdf_file, text_file, images, first, layout)
+
+
+def _page_ranges(numbers):
+    """Agrupar números de página ordenados en rangos contiguos (primera, última)"""
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return [tuple(page_range) for page_range in ranges]
+
+
+def _split_pages(text_file, count):
+    """Texto de cada página de la salida de pdftotext (las páginas acaban en salto de página)"""
+    with open(text_file, encoding="utf-8", errors="replace") as text_in:
+        texts = text_in.read().split("\f")[:count]
+    return texts + [""] * (count - len(texts))
+
+
+def _restore_page(conversion_cache, key, number, svg_dir, file_name):
+    """Recuperar de la caché el texto, la imagen y las medidas de una página; None si no está"""
+    entry = conversion_cache.lookup(key)
+    if entry is None:
+        return None
+    path, meta = entry
+    try:
+        with open(os.path.join(path, "text.txt"), encoding="utf-8", errors="replace") as text_in:
+            text = text_in.read()
+        image = None
+        if meta["image"]:
+            image = os.path.join(svg_dir, f"{file_name}-{number:05d}{os.path.splitext(meta['image'])[1]}")
+            shutil.copyfile(os.path.join(path, meta["image"]), image)
+    except (OSError, KeyError):
+        return None
+    info = None
+    if "width" in meta:
+        info = analysis.PageInfo(number, meta["width"], meta["height"])
+        info.line_height = meta["line_height"]
+    return text, image, info
+
+
+def _store_pages(conversion_cache, keys, numbers, texts, images, kinds, infos, pages_dir):
+    """Guardar en la caché, bajo su huella, cada página recién extraída"""
+    try:
+        with tracing.stage("cache-store", pages=len(numbers)):
+            for number in numbers:
+                text_file = os.path.join(pages_dir, f"{number:05d}.txt")
+                with open(text_file, "w", encoding="utf-8") as text_out:
+                    text_out.write(texts[number])
+                files = {"text.txt": text_file}
+                meta = {"kind": kinds.get(number), "image": None}
+                if images.get(number):
+                    meta["image"] = "page" + os.path.splitext(images[number])[1]
+                    files[meta["image"]] = images[number]
+                info = infos.get(number)
+                if info is not None:
+                    meta.update(width=info.width, height=info.height, line_height=info.line_height)
+                conversion_cache.store(keys[number], files, meta, evict=False)
+    except OSError:
+        pass
+    conversion_cache.evict()
+
+
+def _extract_pages(pdf_file, temp_dir, file_name, options, progress, conversion_cache, first, fingerprints):
+    """Como _extract_document, pero reutilizando de la caché cada página cuya huella ya se conoce.
+
+    Al volver a exportar un PDF en el que sólo cambiaron algunas páginas,
+    únicamente esas se extraen, analizan y renderizan.
+    """
+    svg_dir = os.path.join(temp_dir, "svg")
+    pages_dir = os.path.join(temp_dir, "paginas")
+    os.makedirs(svg_dir, exist_ok=True)
+    os.makedirs(pages_dir, exist_ok=True)
+    keys = {number: conversion_cache.key(page_fingerprint, "page", options.output_options())
+            for number, page_fingerprint in enumerate(fingerprints, start=first)}
+
+    texts, images, infos = {}, {}, {}
+    with tracing.stage("cache-restore", pages=len(keys)) as record:
+        for number, key in keys.items():
+            restored = _restore_page(conversion_cache, key, number, svg_dir, file_name)
+            if restored is not None:
+                texts[number], images[number], infos[number] = restored
+        record["reused"] = len(texts)
+    runner.advance(len(texts))
+
+    missing = [number for number in keys if number not in texts]
+    if missing:
+        if texts:
+            _notify(progress, f"{len(texts)} páginas sin cambios; extrayendo las {len(missing)} restantes...")
+        _notify(progress, "Extrayendo texto del PDF...")
+        ranges = _page_ranges(missing)
+        for page_range in ranges:
+            range_file = os.path.join(pages_dir, "%05d-%05d.txt" % page_range)
+            try:
+                _extract_text(pdf_file, range_file, progress, page_range)
+            except (FileNotFoundError, subprocess.CalledProcessError) as e:
+                raise ConversionError(f"No se pudo extraer el texto del PDF: {str(e)}") from e
+            count = page_range[1] - page_range[0] + 1
+            texts.update(zip(range(page_range[0], page_range[1] + 1), _split_pages(range_file, count)))
+
+        try:
+            kinds = {}
+            for range_first, range_last in ranges:
+                range_kinds, range_infos = _classify_pages(pdf_file, temp_dir, range_first, range_last,
+                                                           options, progress)
+                kinds.update(zip(range(range_first, range_last + 1), range_kinds))
+                infos.update(zip(range(range_first, range_last + 1), range_infos))
+            images.update(_render_pages(pdf_file, svg_dir, file_name, kinds, options, progress))
+        except (FileNotFoundError, subprocess.CalledProcessError, ConversionError) as e:
+            # Sin guardar en la caché: la próxima exportación volverá a intentarlo
+            _notify(progress, f"Método SVG falló, probando método alternativo... {str(e)}")
+        else:
+            _store_pages(conversion_cache, keys, missing, texts, images, kinds, infos, pages_dir)
+
+    text_file = os.path.join(temp_dir, f"{file_name}.txt")
+    with open(text_file, "w", encoding="utf-8") as text_out:
+        for number in keys:
+            text_out.write(texts[number] + "\f")
+    page_images = [images.get(number) for number in keys]
+    layout = analysis.measure([infos[number] for number in keys if infos.get(number) is not None])
+    return _build_document(pdf_file, text_file, page_images, first, layout)
+
+
+def _classify_pages(pdf_file, temp_dir, first, last, options, progress):
+    """Tipo y datos (analysis.PageInfo) de cada página según analysis.py.
+
+    Devuelve (tipos, datos); si no se analiza o el análisis falla, todas
+    las páginas son "mixto" y no hay datos.
+    """
+    pages = last - first + 1
+    if not options.analyze:
+        return [analysis.MIXED] * pages, []
+    _notify(progress, "Analizando el contenido de las páginas...")
+    try:
+        with tracing.stage("analysis", [pdf_file]) as record:
+            infos = analysis.analyze(pdf_file, temp_dir, first, last)
+            kinds = [info.kind for info in infos]
+            for kind in kinds:
+                record[kind] = record.get(kind, 0) + 1
+        return kinds, infos
+    except (OSError, subprocess.CalledProcessError) as e:
+        _notify(progress, f"No se pudo analizar el PDF, se renderizarán todas las páginas: {str(e)}")
+        return [analysis.MIXED] * pages, []
+
+
+def _render_pages(pdf_file, svg_dir, file_name, kinds, options, progress):
+    """Obtener el gráfico de cada página según su tipo ({número: tipo} → {número: imagen}).
+
+    Las páginas de texto quedan sin imagen (None).
+    """
+    images = dict.fromkeys(kinds)
+    svg_pages = [number for number, kind in kinds.items() if kind in analysis.RENDERED_KINDS]
+    scanned_pages = [number for number, kind in kinds.items() if kind == analysis.SCANNED]
+    # Las páginas de texto no necesitan más trabajo en esta fase
+    runner.advance(len(kinds) - len(svg_pages) - len(scanned_pages))
+
+    # Paso 1: convertir las páginas a SVG en paralelo para preservar mejor el formato
+    if svg_pages:
+        _notify(progress, "Convirtiendo PDF a SVG para mejor preservación del formato...")
+        svg_files = render_svg_pages(pdf_file, svg_dir, file_name, options.svg_jobs, options.svg_chunk_size,
+                                     page_numbers=svg_pages)
+        # Rasterizar o simplificar las páginas demasiado complejas para pandoc
+        with tracing.stage("complexity", svg_files) as record:
+            rendered = complexity.apply_budget(pdf_file, svg_files, options, options.svg_jobs, svg_pages)
+            record["rasterized"] = sum(1 for image in rendered if not image.endswith(".svg"))
+        images.update(zip(svg_pages, rendered))
+
+    # Las páginas escaneadas se rasterizan directamente, sin pasar por SVG
+    if scanned_pages:
+        _notify(progress, "Rasterizando páginas escaneadas...")
+        rasters = complexity.rasterize_pages(pdf_file, scanned_pages, os.path.join(svg_dir, file_name),
+                                             options, options.svg_jobs)
+        images.update(zip(scanned_pages, rasters))
+    return images
+
+
+def _build_document(pdf_file, text_file, page_images, first=1, layout=None):
+    with tracing.stage("parse-text", [text_file]):
+        pages = document.parse_text(text_file, len(page_images) or None)
+    images = page_images + [None] * (len(pages) - len(page_images))
+    layout = layout or {}
+    return document.Document(pdf_file, [
+        document.Page(number, paragraphs, image)
+        for number, (paragraphs, image) in enumerate(zip(pages, images), start=first)
+    ], layout.get("page_size"), layout.get("font_size"))
+
+
+def convert_pdf(pdf_file, output_dir, output_format="docx", progress=None, options=None, control=None):
+    """Convertir un PDF a un único formato; devuelve su ConversionResult"""
+    return export_pdf(pdf_file, output_dir, [output_format], progress, options, control)[0]
+
+
+def export_pdf(pdf_file, output_dir, formats, progress=None, options=None, control=None):
+    """Convertir un PDF a uno o varios formatos dentro de output_dir.
+
+    La extracción y el renderizado se hacen una sola vez para todos los
+    formatos. progress recibe mensajes de texto con el paso actual;
+    control (runner.JobControl) permite cancelar la conversión y seguir su
+    progreso por páginas. Devuelve un ConversionResult por formato, en el
+    orden pedido, o lanza ConversionError si alguno no se pudo generar
+    (ConversionCancelled si se canceló).
+    """
+    options = options or ConversionOptions()
+    formats = list(dict.fromkeys(formats))
+    if not formats:
+        raise ConversionError("No se indicó ningún formato de salida")
+    for output_format in formats:
+        if output_format not in FORMATS:
+            raise ConversionError(f"Formato no soportado: {output_format}")
+    if not os.path.isfile(pdf_file):
+        raise ConversionError(f"El archivo no existe: {pdf_file}")
+
+    file_name = os.path.splitext(os.path.basename(pdf_file))[0]
+    output_docs = {fmt: os.path.join(output_dir, f"{file_name}.{fmt}") for fmt in formats}
+
+    control = control or runner.JobControl()
+    memory_bytes = options.max_tool_memory_mb * 1024 * 1024 if options.max_tool_memory_mb else None
+    control.configure(options.tool_timeout, options.max_tool_cpu_seconds, memory_bytes)
+    try:
+        with runner.activate(control):
+            if not options.trace_dir:
+                return _export(pdf_file, output_docs, formats, progress, options)
+            return _export_traced(pdf_file, output_docs, formats, progress, options)
+    except runner.Cancelled as e:
+        raise ConversionCancelled(str(e)) from e
+
+
+def trace_file_path(pdf_file, trace_dir):
+    """Ruta de la traza JSON de un PDF (se escribe también cuando la conversión falla)"""
+    file_name = os.path.splitext(os.path.basename(pdf_file))[0]
+    path_hash = hashlib.sha1(os.path.abspath(pdf_file).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(trace_dir, f"{file_name}-{path_hash}.trace.json")
+
+
+def _export_traced(pdf_file, output_docs, formats, progress, options):
+    """Exportar registrando una traza JSON en options.trace_dir"""
+    file_name = os.path.splitext(os.path.basename(pdf_file))[0]
+    tracer = tracing.Tracer(file_name)
+    tracer.set(pdf_file=pdf_file, formats=formats, pdf_bytes=os.path.getsize(pdf_file))
+    os.makedirs(options.trace_dir, exist_ok=True)
+    trace_file = trace_file_path(pdf_file, options.trace_dir)
+    try:
+        with tracing.activate(tracer):
+            results = _export(pdf_file, output_docs, formats, progress, options)
+        tracer.set(methods={fmt: result.method for fmt, result in zip(formats, results)},
+                   cached=[fmt for fmt, result in zip(formats, results) if result.cached])
+        for result in results:
+            result.trace_file = trace_file
+        return results
+    except Exception as e:
+        tracer.set(error=str(e))
+        raise
+    finally:
+        tracer.write(trace_file)
+
+
+def _export(pdf_file, output_docs, formats, progress, options):
+    results = {}
+
+    conversion_cache = intermediate_key = None
+    output_keys = {}
+    if options.use_cache:
+        conversion_cache = cache.ConversionCache(max_bytes=options.cache_max_bytes,
+                                                 tools=deps.get_registry().toolchain_versions())
+        with tracing.stage("hash-pdf", [pdf_file]):
+            pdf_digest = cache.file_digest(pdf_file)
+        intermediate_key = conversion_cache.key(pdf_digest, "ir", options.output_options())
+        for fmt in formats:
+            output_keys[fmt] = conversion_cache.key(pdf_digest, fmt, options.output_options())
+            result = _restore_output(conversion_cache, output_keys[fmt], output_docs[fmt], pdf_file)
+            if result is not None:
+                _notify(progress, f"{fmt.upper()} recuperado de la caché")
+                results[fmt] = result
+
+    pending = {fmt: path for fmt, path in output_docs.items() if fmt not in results}
+    if pending:
+        control = runner.current()
+        start_count = control.subprocesses
+        converted = _convert(pdf_file, pending, progress, options, conversion_cache, intermediate_key)
+        subprocesses = control.subprocesses - start_count
+        for fmt, result in converted.items():
+            result.subprocesses = subprocesses
+            results[fmt] = result
+            if conversion_cache:
+                extension = os.path.splitext(result.output_path)[1]
+                try:
+                    with tracing.stage("cache-store", [result.output_path]):
+                        conversion_cache.store(output_keys[fmt], {"output" + extension: result.output_path},
+                                               {"method": result.method, "extension": extension})
+                except OSError as e:
+                    _notify(progress, f"No se pudo guardar el resultado en la caché: {str(e)}")
+
+    failed = [fmt for fmt in formats if fmt not in results]
+    if failed:
+        raise ConversionError("No se pudo generar el archivo de salida: " +
+                              ", ".join(fmt.upper() for fmt in failed))
+    return [results[fmt] for fmt in formats]
+
+
+# Métodos de conversión, del más fiel al más sencillo
+METHODS = ("svg+html", "texto", "rescate")
+
+
+def _page_windows(pages, options):
+    """Ventanas (primera, última) en que dividir el PDF, o None si se convierte entero"""
+    if not options.window_pages or not pages or pages <= max(1, options.window_pages):
+        return None
+    size = max(1, options.window_pages)
+    return [(first, min(first + size - 1, pages)) for first in range(1, pages + 1, size)]
+
+
+def _convert(pdf_file, output_docs, progress, options, conversion_cache, intermediate_key):
+    """Convertir el PDF entero o, si es más largo que options.window_pages, por ventanas.
+
+    Devuelve {formato: ConversionResult}.
+    """
+    try:
+        pages = page_count(pdf_file)
+    except (FileNotFoundError, subprocess.CalledProcessError, ConversionError):
+        pages = None
+    if pages:
+        # Progreso por páginas: una unidad al renderizar cada página y otra al escribirla
+        control = runner.current()
+        if control is not None:
+            control.set_total(2 * pages)
+    # Huella de cada página para reutilizar de la caché las que no cambiaron
+    fingerprints = None
+    if pages and conversion_cache:
+        with tracing.stage("fingerprint", [pdf_file]) as record:
+            fingerprints = fingerprint.page_fingerprints(pdf_file)
+            record["pages"] = len(fingerprints) if fingerprints else 0
+        if fingerprints is not None and len(fingerprints) != pages:
+            fingerprints = None
+    windows = _page_windows(pages, options)
+    # Crear un directorio temporal con tempfile para mayor seguridad
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if windows is None:
+            return _convert_pages(pdf_file, output_docs, temp_dir, progress, options,
+                                  conversion_cache, intermediate_key, (1, pages) if pages else None,
+                                  fingerprints=fingerprints)
+        return _convert_windows(pdf_file, output_docs, temp_dir, windows, progress, options,
+                                conversion_cache, intermediate_key, fingerprints)
+
+
+def _convert_windows(pdf_file, output_docs, temp_dir, windows, progress, options, conversion_cache,
+                     intermediate_key, fingerprints=None):
+    """Convertir cada ventana de páginas por separado y unir los documentos parciales.
+
+    La memoria usada por pandoc y por la representación intermedia depende
+    del tamaño de la ventana, no del documento. Las partes se generan en
+    ODT y/o DOCX; el DOC se obtiene del DOCX ya unido. Con las huellas de
+    las páginas, cada parte se guarda en la caché y las ventanas sin
+    cambios no se vuelven a convertir: sólo se unen de nuevo.
+    """
+    file_name = os.path.splitext(os.path.basename(pdf_file))[0]
+    part_formats = [fmt for fmt in ("odt", "docx") if fmt in output_docs or (fmt == "docx" and "doc" in output_docs)]
+    parts_dir = os.path.join(temp_dir, "partes")
+    os.makedirs(parts_dir)
+
+    def convert_window(index, window):
+        first, last = window
+        window_fingerprints = fingerprints[first - 1:last] if fingerprints else None
+        part_keys = {}
+        if conversion_cache and window_fingerprints:
+            window_digest = hashlib.sha1("".join(window_fingerprints).encode("ascii")).hexdigest()
+            part_options = dict(options.output_options(), toc=index == 0)
+            part_keys = {fmt: conversion_cache.key(window_digest, f"part-{fmt}", part_options)
+                         for fmt in part_formats}
+            restored = _restore_parts(conversion_cache, part_keys, parts_dir, index)
+            if restored is not None:
+                runner.advance(2 * (last - first + 1))
+                return restored
+        window_dir = os.path.join(temp_dir, f"ventana-{index:05d}")
+        os.makedirs(window_dir)
+        part_docs = {fmt: os.path.join(window_dir, f"{file_name}.{fmt}") for fmt in part_formats}
+        window_key = conversion_cache.key(intermediate_key, f"ir-{first}-{last}", {}) if conversion_cache else None
+        with tracing.stage("window", first=first, last=last):
+            results = _convert_pages(pdf_file, part_docs, window_dir, lambda message: _notify(
+                progress, f"Páginas {first}-{last}: {message}"), options, conversion_cache, window_key,
+                window, toc=index == 0, fingerprints=window_fingerprints)
+        missing = [fmt.upper() for fmt in part_formats if fmt not in results]
+        if missing:
+            raise ConversionError(f"No se pudieron convertir las páginas {first}-{last}: " + ", ".join(missing))
+        # Conservar sólo las partes y liberar el espacio temporal de la ventana
+        parts = {}
+        for fmt, result in results.items():
+            parts[fmt] = os.path.join(parts_dir, f"{index:05d}.{fmt}")
+            shutil.move(result.output_path, parts[fmt])
+        shutil.rmtree(window_dir, ignore_errors=True)
+        method = results[part_formats[0]].method
+        if part_keys:
+            try:
+                with tracing.stage("cache-store", list(parts.values())):
+                    for fmt, key in part_keys.items():
+                        conversion_cache.store(key, {"part." + fmt: parts[fmt]}, {"method": method})
+            except OSError:
+                pass
+        return parts, method
+
+    _notify(progress, f"Convirtiendo {len(windows)} bloques de {options.window_pages} páginas...")
+    jobs = max(1, min(options.window_jobs or 1, len(windows)))
+    if jobs == 1:
+        converted = [convert_window(index, window) for index, window in enumerate(windows)]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            converted = list(pool.map(tracing.wrap(convert_window), range(len(windows)), windows))
+    # El método del documento es el menos fiel de los usados en sus ventanas
+    method = max((window_method for _, window_method in converted), key=METHODS.index)
+
+    results = {}
+    for fmt in part_formats:
+        target = output_docs.get(fmt) or os.path.join(temp_dir, f"{file_name}.{fmt}")
+        parts = [window_parts[fmt] for window_parts, _ in converted]
+        _notify(progress, f"Uniendo {len(parts)} partes en un solo {fmt.upper()}...")
+        try:
+            with tracing.stage(f"merge-{fmt}", parts, [target], parts=len(parts)):
+                merge.merge_documents(parts, target, fmt)
+        except (OSError, merge.MergeError) as e:
+            _notify(progress, f"No se pudo generar {fmt.upper()}: {str(e)}")
+            continue
+        if fmt in output_docs:
+            results[fmt] = ConversionResult(pdf_file, target, method)
+        if fmt == "docx" and "doc" in output_docs:
+            results["doc"] = ConversionResult(pdf_file, _docx_to_doc(target, output_docs["doc"], progress), method)
+    return results
+
+
+def _convert_pages(pdf_file, output_docs, temp_dir, progress, options, conversion_cache, intermediate_key,
+                   window=None, toc=True, fingerprints=None):
+    """Ejecutar los métodos de conversión, del más fiel al formato al más sencillo.
+
+    Todos parten de la misma representación intermedia: si un método falla
+    para algún formato, el siguiente sólo repite el paso final de escritura
+    para los formatos que faltan. window limita la conversión a un rango de
+    páginas y fingerprints son las huellas de esas páginas. Devuelve
+    {formato: ConversionResult}.
+    """
+    file_name = os.path.splitext(os.path.basename(pdf_file))[0]
+    results = {}
+
+    def pending():
+        return {fmt: path for fmt, path in output_docs.items() if fmt not in results}
+
+    def write(source_file, source_format, method, toc=toc):
+        runner.check_cancelled()
+        with tracing.stage("tier", [source_file], tier=method, formats=sorted(pending())):
+            produced = _write_outputs(source_file, source_format, pending(), temp_dir, progress, toc)
+        for fmt, path in produced.items():
+            results[fmt] = ConversionResult(pdf_file, path, method)
+
+    def write_native(method):
+        runner.check_cancelled()
+        with tracing.stage("tier", tier=method, formats=sorted(pending()), native=True):
+            produced = _write_native(doc, pending(), temp_dir, progress)
+        for fmt, path in produced.items():
+            results[fmt] = ConversionResult(pdf_file, path, method)
+
+    doc = _extract_document(pdf_file, temp_dir, file_name, options, progress,
+                            conversion_cache, intermediate_key, window, fingerprints)
+    html_file = os.path.join(temp_dir, f"{file_name}.html")
+    markdown_file = os.path.join(temp_dir, f"{file_name}.md")
+
+    # Método 1: HTML con las páginas SVG incrustadas (texto+gráficos);
+    # las páginas de sólo texto se escriben como texto editable
+    if doc.has_images:
+        _notify(progress, "Generando HTML con contenido mixto (texto+gráficos)...")
+        try:
+            with tracing.stage("write-html", outputs=[html_file]):
+                document.write_html(doc, html_file)
+            _notify(progress, "Convirtiendo HTML enriquecido al formato final...")
+            write(html_file, "html", "svg+html")
+        except OSError as e:
+            _notify(progress, f"Método SVG falló, probando método alternativo... {str(e)}")
+
+    # Método 2: texto editable, escrito directamente en ODT/DOCX o (sin
+    # native_text) como Markdown en una sola pasada de pandoc
+    if pending():
+        names = ", ".join(fmt.upper() for fmt in pending())
+        _notify(progress, f"Generando {names} a partir del texto...")
+        if options.native_text:
+            write_native("texto")
+        else:
+            try:
+                with tracing.stage("write-markdown", outputs=[markdown_file]):
+                    document.write_markdown(doc, markdown_file)
+                write(markdown_file, "markdown", "texto")
+            except OSError as e:
+                _notify(progress, f"Método de texto falló: {str(e)}")
+
+    # Método 3: rescate final con HTML de sólo texto y sin índice
+    if pending():
+        _notify(progress, "Intentando método de rescate final...")
+        try:
+            with tracing.stage("write-html", outputs=[html_file], images=False):
+                document.write_html(doc, html_file, with_images=False)
+            write(html_file, "html", "rescate", toc=False)
+        except OSError as e:
+            _notify(progress, f"Error en la conversión: {str(e)}")
+
+    runner.advance(len(doc.pages))
+    return results
@@ -0,0 +1,597 @@
+"""Huella de cada página de un PDF para volver a exportar sólo lo que cambió.
+
+La huella de una página es el hash de su diccionario y de todo lo que
+alcanza a través de referencias: flujos de contenido, recursos (fuentes,
+imágenes, patrones...), anotaciones y los atributos heredados del árbol
+de páginas. Se omiten las referencias al árbol (/Parent, /P) y a otras
+páginas (enlaces), para que editar una página no cambie la huella de las
+demás. Si dos páginas tienen la misma huella, pdftotext y pdftocairo
+producen el mismo resultado para ambas.
+
+Sólo se lee la estructura del PDF, sin interpretar el contenido: se
+localizan los objetos ("N G obj", también dentro de flujos de objetos) y
+cuando un objeto aparece varias veces (actualizaciones incrementales)
+vale el último. Ante cualquier cosa que no se sepa leer (PDF cifrado,
+filtros desconocidos, estructura dañada) se devuelve None y la
+conversión se hace completa.
+
+El mismo índice de objetos sirve para saber qué páginas pintan trazados
+vectoriales (drawing_pages), algo que pdftotext y pdfimages no informan
+y que analysis.py necesita para no tratar como texto una página con
+gráficos, tablas o dibujos.
+"""
+import functools
+import hashlib
+import mmap
+import os
+import re
+import zlib
+
+# Atributos de página que se heredan de los nodos /Pages
+_INHERITABLE = (b"Resources", b"MediaBox", b"CropBox", b"Rotate")
+# Claves del catálogo que afectan a cómo se dibujan todas las páginas
+_DOCUMENT_KEYS = (b"OCProperties", b"AcroForm")
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_OBJ = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_REF = re.compile(rb"(\d+)\s+(\d+)\s+R\b")
+_REF_AT = re.compile(rb"\s+(\d+)\s+R\b")
+# Referencias hacia arriba en el árbol (página padre, página de una anotación)
+_BACK_REF = re.compile(rb"/(?:Parent|P)\s+\d+\s+\d+\s+R\b")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R\b")
+_STREAM = re.compile(rb"\s*stream\r?\n")
+_WHITESPACE = b" \t\r\n\f\x00"
+_DELIMITERS = b"()<>[]{}/%"
+
+# Operadores de los flujos de contenido que pintan el trazado en construcción (contornos y rellenos)
+_STROKE_OPERATORS = frozenset((b"S", b"s"))
+_FILL_OPERATORS = frozenset((b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*"))
+# Operadores que añaden puntos al trazado y cuántos puntos reciben
+_PATH_POINTS = {b"m": 1, b"l": 1, b"c": 3, b"v": 2, b"y": 2}
+# Un relleno que cubre esta fracción de la página es el color de fondo
+_BACKGROUND_MIN_COVERAGE = 0.9
+# Grosor máximo (en puntos) de un filete: subrayados, líneas de cabecera...
+_RULE_MAX_THICKNESS = 3
+# Con más filetes que estos la página tiene tablas o gráficos
+_MAX_RULES = 6
+# Tamaño de página si no se puede leer el /MediaBox (carta)
+_DEFAULT_PAGE_AREA = 612 * 792
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+# Cadenas (con un nivel de paréntesis anidados), cadenas hexadecimales, nombres, comentarios y el resto de tokens
+_CONTENT_TOKEN = re.compile(
+    rb"\((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)"
+    rb"|<[0-9A-Fa-f\s]*>|/[^\s/\[\]()<>{}%]*|%[^\r\n]*|[^\s/\[\]()<>{}%]+", re.S)
+# Fin de los datos binarios de una imagen en línea (BI ... ID datos EI)
+_INLINE_IMAGE_END = re.compile(rb"\sEI(?=\s|$)")
+# Anotaciones que no dibujan nada en la página
+_INVISIBLE_ANNOTATIONS = (b"/Link", b"/Popup")
+
+
+class FingerprintError(Exception):
+    """El PDF no tiene la estructura esperada"""
+
+
+def _skip_space(data, pos):
+    while pos < len(data):
+        if data[pos] in _WHITESPACE:
+            pos += 1
+        elif data[pos] == 0x25:  # % comentario hasta fin de línea
+            while pos < len(data) and data[pos] not in b"\r\n":
+                pos += 1
+        else:
+            break
+    return pos
+
+
+def _string_end(data, pos):
+    """Fin de una cadena literal (...) que empieza en pos (admite paréntesis anidados y escapes)"""
+    depth = 0
+    while pos < len(data):
+        char = data[pos]
+        if char == 0x5C:  # \
+            pos += 2
+            continue
+        if char == 0x28:
+            depth += 1
+        elif char == 0x29:
+            depth -= 1
+            if not depth:
+                return pos + 1
+        pos += 1
+    raise FingerprintError("Cadena sin cerrar")
+
+
+def _token_end(data, pos):
+    while pos < len(data) and data[pos] not in _WHITESPACE and data[pos] not in _DELIMITERS:
+        pos += 1
+    return pos
+
+
+def _value_end(data, pos):
+    """Fin del valor PDF que empieza en pos (diccionario, array, cadena, nombre, número o referencia).
+
+    Los diccionarios y arrays anidados se recorren con una pila, no con
+    recursión, para que un anidamiento muy profundo no agote la pila.
+    """
+    closers = []
+    while True:
+        if closers and data.startswith(closers[-1], pos):
+            pos += len(closers.pop())
+            if not closers:
+                return pos
+        elif data.startswith(b"<<", pos):
+            closers.append(b">>")
+            pos += 2
+        elif data[pos:pos + 1] == b"[":
+            closers.append(b"]")
+            pos += 1
+        else:
+            pos = _scalar_end(data, pos)
+            if not closers:
+                return pos
+        pos = _skip_space(data, pos)
+
+
+def _scalar_end(data, pos):
+    """Fin de un valor que no es diccionario ni array"""
+    char = data[pos:pos + 1]
+    if char == b"(":
+        return _string_end(data, pos)
+    if char == b"<":
+        end = data.find(b">", pos)
+        if end < 0:
+            raise FingerprintError("Cadena hexadecimal sin cerrar")
+        return end + 1
+    if char == b"/":
+        return _token_end(data, pos + 1)
+    if not char:
+        raise FingerprintError("Valor vacío")
+    end = _token_end(data, pos)
+    if end == pos:
+        raise FingerprintError(f"Carácter inesperado: {char!r}")
+    # "n g R" es un único valor
+    if data[pos:end].isdigit():
+        match = _REF_AT.match(data, end)
+        if match:
+            return match.end()
+    return end
+
+
+def _parse_dict(data, pos=0):
+    """Claves de un diccionario y el texto de su valor: {b"Clave": b"valor"}"""
+    pos = _skip_space(data, pos)
+    if not data.startswith(b"<<", pos):
+        raise FingerprintError("Se esperaba un diccionario")
+    entries = {}
+    pos = _skip_space(data, pos + 2)
+    while not data.startswith(b">>", pos):
+        if data[pos:pos + 1] != b"/":
+            raise FingerprintError("Clave de diccionario no válida")
+        key_end = _token_end(data, pos + 1)
+        value_start = _skip_space(data, key_end)
+        value_end = _value_end(data, value_start)
+        entries[data[pos + 1:key_end]] = data[value_start:value_end]
+        pos = _skip_space(data, value_end)
+    return entries
+
+
+def _ref(value):
+    match = _REF.fullmatch(value.strip())
+    return int(match.group(1)) if match else None
+
+
+class _PdfObjects:
+    """Índice de los objetos del PDF: número → (posición, texto del objeto, flujo)"""
+
+    def __init__(self, data):
+        self.data = data
+        # número → (posición en el archivo, bytes del valor, (inicio, fin) de los datos del flujo o None)
+        self.objects = {}
+        self._digests = {}
+        self._refs = {}
+        self._scan()
+
+    def _add(self, number, position, value, stream):
+        previous = self.objects.get(number)
+        if previous is None or previous[0] <= position:
+            self.objects[number] = (position, value, stream)
+
+    def _scan(self):
+        data = self.data
+        pos = 0
+        object_streams = []
+        while True:
+            match = _OBJ.search(data, pos)
+            if match is None:
+                break
+            start = match.end()
+            end = data.find(b"endobj", start)
+            if end < 0:
+                break
+            keyword = data.find(b"stream", start, end)
+            if keyword < 0:
+                self._add(int(match.group(1)), match.start(), data[start:end].strip(), None)
+                pos = end + 6
+                continue
+            # Objeto con flujo: el diccionario indica la longitud de los datos
+            value = data[start:keyword].strip()
+            if _value_end(value, 0) != len(value):
+                raise FingerprintError("Objeto con flujo mal formado")
+            stream_match = _STREAM.match(data, keyword)
+            if stream_match is None:
+                raise FingerprintError("Objeto con flujo mal formado")
+            entries = _parse_dict(value)
+            stream_start = stream_match.end()
+            stream_end = -1
+            length = entries.get(b"Length", b"").strip()
+            if length.isdigit():
+                stream_end = stream_start + int(length)
+                if data.find(b"endstream", stream_end, stream_end + 32) < 0:
+                    stream_end = -1
+            if stream_end < 0:
+                # Longitud indirecta o errónea: buscar el final del flujo
+                stream_end = data.find(b"endstream", stream_start)
+                if stream_end < 0:
+                    raise FingerprintError("Flujo sin cerrar")
+            number = int(match.group(1))
+            self._add(number, match.start(), value, (stream_start, stream_end))
+            if entries.get(b"Type", b"").strip() == b"/ObjStm":
+                object_streams.append((match.start(), entries, stream_start, stream_end))
+            pos = data.find(b"endobj", stream_end)
+            pos = stream_end if pos < 0 else pos + 6
+        for position, entries, stream_start, stream_end in object_streams:
+            self._scan_object_stream(position, entries, self.data[stream_start:stream_end])
+
+    def _scan_object_stream(self, position, entries, raw):
+        """Añadir los objetos guardados dentro de un flujo de objetos (/Type /ObjStm)"""
+        content = _decode(entries, raw)
+        count = int(entries[b"N"])
+        first = int(entries[b"First"])
+        header = content[:first].split()
+        offsets = [(int(header[2 * index]), int(header[2 * index + 1])) for index in range(count)]
+        for index, (number, offset) in enumerate(offsets):
+            end = offsets[index + 1][1] if index + 1 < count else len(content) - first
+            # Los objetos del flujo cuentan como escritos en la posición del flujo
+            self._add(number, position + index / count, content[first + offset:first + end].strip(), None)
+
+    def dict(self, number):
+        entry = self.objects.get(number)
+        if entry is None:
+            raise FingerprintError(f"Falta el objeto {number}")
+        return _parse_dict(entry[1])
+
+    def stream(self, number):
+        """Datos descodificados del flujo del objeto"""
+        entry = self.objects.get(number)
+        if entry is None or entry[2] is None:
+            raise FingerprintError(f"El objeto {number} no es un flujo")
+        start, end = entry[2]
+        return _decode(_parse_dict(entry[1]), self.data[start:end])
+
+    def resolve(self, value):
+        """Diccionario de un valor que es un diccionario o una referencia a uno"""
+        number = _ref(value)
+        return self.dict(number) if number is not None else _parse_dict(value)
+
+    def digest(self, number):
+        """Hash del objeto (valor sin números de objeto y datos de su flujo); se calcula una sola vez"""
+        digest = self._digests.get(number)
+        if digest is None:
+            entry = self.objects.get(number)
+            hasher = hashlib.sha1()
+            if entry is not None:
+                hasher.update(_normalize(entry[1]))
+                if entry[2] is not None:
+                    start, end = entry[2]
+                    for offset in range(start, end, _HASH_CHUNK_SIZE):
+                        hasher.update(self.data[offset:min(offset + _HASH_CHUNK_SIZE, end)])
+            digest = self._digests[number] = hasher.digest()
+        return digest
+
+    def refs(self, number):
+        """Objetos a los que apunta el objeto, sin contar las referencias hacia arriba del árbol"""
+        refs = self._refs.get(number)
+        if refs is None:
+            entry = self.objects.get(number)
+            refs = [] if entry is None else _refs_in(entry[1])
+            self._refs[number] = refs
+        return refs
+
+
+def _decode(entries, raw):
+    """Descodificar los datos de un flujo (sólo sin filtro o con FlateDecode)"""
+    filters = entries.get(b"Filter", b"").strip(b" []\r\n")
+    if filters not in (b"", b"/FlateDecode") or b"DecodeParms" in entries:
+        raise FingerprintError("Flujo con filtros no soportados")
+    # decompressobj admite los bytes sobrantes tras los datos comprimidos
+    return zlib.decompressobj().decompress(raw) if filters else raw
+
+
+def _normalize(value):
+    """Valor sin las referencias hacia arriba del árbol y con las demás sin su número de objeto"""
+    return _REF.sub(b"R", _BACK_REF.sub(b"", value))
+
+
+def _refs_in(value):
+    return [int(match.group(1)) for match in _REF.finditer(_BACK_REF.sub(b"", value))]
+
+
+def _closure_digest(objects, hasher, refs, skip):
+    """Añadir al hash todos los objetos alcanzables desde refs, sin entrar en los de skip.
+
+    Los objetos se recorren en profundidad en el orden de sus referencias y
+    se identifican por su contenido y su orden de visita, nunca por su
+    número: reescribir el PDF o insertar páginas renumera los objetos sin
+    cambiar la huella de las páginas que no cambiaron.
+    """
+    visited = {}
+    stack = list(reversed(refs))
+    while stack:
+        number = stack.pop()
+        if number in skip:
+            # Enlace a otra página
+            hasher.update(b"P;")
+        elif number in visited:
+            hasher.update(b"#%d;" % visited[number])
+        else:
+            visited[number] = len(visited)
+            hasher.update(objects.digest(number))
+            stack.extend(reversed(objects.refs(number)))
+
+
+def _pages(objects, root):
+    """Páginas en orden: lista de (número de objeto, atributos heredados)"""
+    pages = []
+    pages_ref = _ref(objects.dict(root).get(b"Pages", b""))
+    if pages_ref is None:
+        raise FingerprintError("El catálogo no tiene /Pages")
+    stack = [(pages_ref, {})]
+    visited = set()
+    while stack:
+        number, inherited = stack.pop()
+        if number in visited:
+            raise FingerprintError("Árbol de páginas con ciclos")
+        visited.add(number)
+        node = objects.dict(number)
+        if b"Kids" not in node:
+            pages.append((number, inherited))
+            continue
+        inherited = dict(inherited)
+        inherited.update((key, node[key]) for key in _INHERITABLE if key in node)
+        kids = [int(match.group(1)) for match in _REF.finditer(node[b"Kids"])]
+        stack.extend((kid, inherited) for kid in reversed(kids))
+    return pages
+
+
+def page_fingerprints(pdf_file):
+    """Huella (hexadecimal) de cada página del PDF, en orden; None si no se puede calcular"""
+    try:
+        with open(pdf_file, "rb") as pdf_in, mmap.mmap(pdf_in.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data.find(b"/Encrypt") >= 0:
+                return None
+            roots = list(_ROOT.finditer(data))
+            if not roots:
+                return None
+            objects = _PdfObjects(data)
+            root = int(roots[-1].group(1))
+            pages = _pages(objects, root)
+            page_numbers = {number for number, _ in pages}
+
+            catalog = objects.dict(root)
+            document = hashlib.sha1()
+            for key in _DOCUMENT_KEYS:
+                if key in catalog:
+                    document.update(key + _normalize(catalog[key]))
+                    _closure_digest(objects, document, _refs_in(catalog[key]), page_numbers)
+
+            fingerprints = []
+            for number, inherited in pages:
+                hasher = document.copy()
+                value = objects.objects[number][1]
+                hasher.update(_normalize(value))
+                refs = _refs_in(value)
+                page = _parse_dict(value)
+                for key, inherited_value in inherited.items():
+                    if key not in page:
+                        hasher.update(key + _normalize(inherited_value))
+                        refs += _refs_in(inherited_value)
+                _closure_digest(objects, hasher, refs, page_numbers)
+                fingerprints.append(hasher.hexdigest())
+            return fingerprints
+    except Exception:
+        # La huella sólo sirve para aprovechar la caché: cualquier fallo del
+        # lector (también RecursionError o MemoryError) equivale a no tenerla
+        return None
+
+
+def _multiply(matrix, ctm):
+    """Producto de dos matrices de transformación [a b c d e f]"""
+    a, b, c, d, e, f = matrix
+    A, B, C, D, E, F = ctm
+    return (a * A + b * C, a * B + b * D, c * A + d * C, c * B + d * D,
+            e * A + f * C + E, e * B + f * D + F)
+
+
+def _numbers(operands, count):
+    """Los últimos count operandos como números, o None si no lo son"""
+    if len(operands) < count:
+        return None
+    values = operands[len(operands) - count:]
+    if not all(_NUMBER.fullmatch(value) for value in values):
+        return None
+    return [float(value) for value in values]
+
+
+class _PageDrawing:
+    """Lectura de los flujos de contenido de una página para saber si dibuja.
+
+    Cuentan como dibujo los trazados pintados y los degradados, salvo un
+    relleno que cubre toda la página (el color de fondo) y unos pocos
+    filetes finos (subrayados, líneas de cabecera o pie), que no se pierden
+    de forma apreciable al exportar la página como texto.
+    """
+
+    def __init__(self, page_area):
+        self.page_area = page_area
+        self.rules = 0
+
+    def _paints(self, points, fill):
+        """Si pintar un trazado con estos puntos (en espacio de página) es un dibujo"""
+        if not points:
+            return False
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        width, height = max(xs) - min(xs), max(ys) - min(ys)
+        if fill and width * height >= _BACKGROUND_MIN_COVERAGE * self.page_area:
+            return False
+        if min(width, height) <= _RULE_MAX_THICKNESS:
+            self.rules += 1
+            return self.rules > _MAX_RULES
+        return True
+
+    def scan(self, data, ctm):
+        """Si el flujo dibuja y los XObject que usa con Do: (dibuja, [(nombre, matriz)])"""
+        forms = []
+        saved = []
+        points = []
+        operands = []
+        pos = 0
+        while True:
+            match = _CONTENT_TOKEN.search(data, pos)
+            if match is None:
+                return False, forms
+            pos = match.end()
+            token = match.group(0)
+            if token.startswith(b"%"):
+                continue
+            if token[:1] in b"/(<" or _NUMBER.fullmatch(token) or token in (b"true", b"false", b"null"):
+                operands.append(token)
+                continue
+            if token == b"q":
+                saved.append(ctm)
+            elif token == b"Q":
+                ctm = saved.pop() if saved else ctm
+            elif token == b"cm":
+                matrix = _numbers(operands, 6)
+                if matrix is not None:
+                    ctm = _multiply(matrix, ctm)
+            elif token in _PATH_POINTS or token == b"re":
+                values = _numbers(operands, 4 if token == b"re" else 2 * _PATH_POINTS[token])
+                if values is not None:
+                    if token == b"re":
+                        x, y, width, height = values
+                        values = [x, y, x + width, y, x, y + height, x + width, y + height]
+                    a, b, c, d, e, f = ctm
+                    points.extend((a * x + c * y + e, b * x + d * y + f)
+                                  for x, y in zip(values[::2], values[1::2]))
+            elif token in _STROKE_OPERATORS or token in _FILL_OPERATORS:
+                if self._paints(points, token in _FILL_OPERATORS):
+                    return True, forms
+                points = []
+            elif token == b"n":
+                points = []
+            elif token == b"sh":
+                return True, forms
+            elif token == b"Do" and operands and operands[-1].startswith(b"/"):
+                forms.append((operands[-1][1:], ctm))
+            elif token == b"ID":
+                # Saltar los datos binarios de la imagen en línea
+                end = _INLINE_IMAGE_END.search(data, pos)
+                if end is None:
+                    return False, forms
+                pos = end.end()
+            operands = []
+
+
+def _draws(objects, streams, resources, page_area):
+    """Si los flujos dibujan, directamente o a través de los XObject de formulario que usan"""
+    drawing = _PageDrawing(page_area)
+    pending = [(number, resources, _IDENTITY) for number in reversed(streams)]
+    visited = set()
+    while pending:
+        number, resources, ctm = pending.pop()
+        paints, forms = drawing.scan(objects.stream(number), ctm)
+        if paints:
+            return True
+        xobjects = None
+        for name, form_ctm in reversed(forms):
+            if xobjects is None:
+                resource_dict = objects.resolve(resources) if resources else {}
+                xobjects = objects.resolve(resource_dict.get(b"XObject", b"<<>>"))
+            form = _ref(xobjects.get(name, b""))
+            if form is None or (form, form_ctm) in visited:
+                continue
+            visited.add((form, form_ctm))
+            form_dict = objects.dict(form)
+            if form_dict.get(b"Subtype", b"").strip() != b"/Form":
+                continue
+            matrix = _numbers(form_dict.get(b"Matrix", b"").strip(b" []\r\n").split(), 6)
+            if matrix is not None:
+                form_ctm = _multiply(matrix, form_ctm)
+            pending.append((form, form_dict.get(b"Resources", resources), form_ctm))
+    return False
+
+
+def _page_area(objects, media_box):
+    """Área del /MediaBox de la página (directo o por referencia)"""
+    if media_box is not None and _ref(media_box) is not None:
+        media_box = objects.objects[_ref(media_box)][1]
+    values = _numbers((media_box or b"").strip(b" []\r\n").split(), 4)
+    if values is None:
+        return _DEFAULT_PAGE_AREA
+    x0, y0, x1, y1 = values
+    return abs(x1 - x0) * abs(y1 - y0) or _DEFAULT_PAGE_AREA
+
+
+def _page_draws(objects, number, inherited):
+    """Si la página pinta trazados o tiene anotaciones visibles (campos de formulario, sellos...)"""
+    page = objects.dict(number)
+    annotations = page.get(b"Annots", b"")
+    if _ref(annotations) is not None:
+        annotations = objects.objects[_ref(annotations)][1]
+    for annotation in _refs_in(annotations):
+        annotation = objects.dict(annotation)
+        if b"AP" in annotation and annotation.get(b"Subtype", b"").strip() not in _INVISIBLE_ANNOTATIONS:
+            return True
+    contents = page.get(b"Contents", b"")
+    if _ref(contents) is not None and objects.objects[_ref(contents)][2] is None:
+        # Referencia a un array de flujos
+        contents = objects.objects[_ref(contents)][1]
+    resources = page.get(b"Resources", inherited.get(b"Resources"))
+    page_area = _page_area(objects, page.get(b"MediaBox", inherited.get(b"MediaBox")))
+    return _draws(objects, _refs_in(contents), resources, page_area)
+
+
+@functools.lru_cache(maxsize=4)
+def _drawing_pages(pdf_file, size, mtime_ns):
+    with open(pdf_file, "rb") as pdf_in, mmap.mmap(pdf_in.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data.find(b"/Encrypt") >= 0:
+            return None
+        roots = list(_ROOT.finditer(data))
+        if not roots:
+            return None
+        objects = _PdfObjects(data)
+        drawings = []
+        for number, inherited in _pages(objects, int(roots[-1].group(1))):
+            try:
+                drawings.append(_page_draws(objects, number, inherited))
+            except Exception:
+                # Una página que no se sabe leer no se trata como texto
+                drawings.append(None)
+        return tuple(drawings)
+
+
+def drawing_pages(pdf_file):
+    """Para cada página, en orden, si pinta trazados vectoriales (None si no se sabe); None si no se puede leer.
+
+    El resultado se recuerda por archivo, tamaño y fecha: la conversión por
+    ventanas analiza el mismo PDF varias veces.
+    """
+    try:
+        stat = os.stat(pdf_file)
+        return _drawing_pages(os.path.abspath(pdf_file), stat.st_size, stat.st_mtime_ns)
+    except Exception:
+        # Como en page_fingerprints: cualquier fallo del lector (también
+        # RecursionError o MemoryError) equivale a no saberlo
+        return None
@@ -0,0 +1,144 @@
+"""Cola persistente de trabajos de conversión en SQLite.
+
+Cada archivo se identifica por su ruta, tamaño y fecha de modificación,
+de modo que un archivo ya convertido no se vuelve a encolar tras un
+reinicio y uno sustituido por otro contenido sí. La base de datos usa WAL
+y escrituras síncronas: si el proceso muere, los trabajos que estaban en
+curso cuentan como un intento fallido al arrancar (recover) y no se
+pierde ninguno; un PDF que tumba el proceso una y otra vez acaba como
+fallido tras max_attempts. Los fallos se reintentan con espera
+exponencial.
+"""
+import json
+import os
+import sqlite3
+import time
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Espera antes del primer reintento; se duplica en cada fallo hasta MAX_BACKOFF
+DEFAULT_BACKOFF = 30
+MAX_BACKOFF = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (path, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, next_attempt);
+"""
+
+
+class Job:
+    """Un trabajo reclamado de la cola"""
+
+    def __init__(self, job_id, path, attempts):
+        self.id = job_id
+        self.path = path
+        self.attempts = attempts
+
+
+class JobQueue:
+    """Cola de trabajos; no es segura entre hilos (úsese desde un solo hilo)"""
+
+    def __init__(self, db_path, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # isolation_level=None: las transacciones se abren explícitamente
+        self._db = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def recover(self):
+        """Anotar como fallo los trabajos que quedaron en curso (el proceso anterior murió).
+
+        Devuelve cuántos vuelven a la cola; el resto agotó sus intentos.
+        """
+        rows = self._db.execute("SELECT id, path, attempts FROM jobs WHERE state = ?", (RUNNING,)).fetchall()
+        requeued = 0
+        for row in rows:
+            if self.fail(Job(*row), "El proceso se interrumpió durante la conversión"):
+                requeued += 1
+        return requeued
+
+    def contains(self, path, size, mtime_ns):
+        row = self._db.execute("SELECT 1 FROM jobs WHERE path = ? AND size = ? AND mtime_ns = ?",
+                               (path, size, mtime_ns)).fetchone()
+        return row is not None
+
+    def enqueue(self, files):
+        """Encolar [(ruta, tamaño, mtime_ns)] en una sola transacción; devuelve cuántos eran nuevos"""
+        now = time.time()
+        added = 0
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for path, size, mtime_ns in files:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO jobs (path, size, mtime_ns, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, now, now))
+                added += cursor.rowcount
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, limit=1):
+        """Marcar como en curso hasta `limit` trabajos listos y devolverlos (los más antiguos primero)"""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT id, path, attempts FROM jobs WHERE state = ? AND next_attempt <= ? "
+                "ORDER BY next_attempt, id LIMIT ?", (PENDING, now, limit)).fetchall()
+            self._db.executemany("UPDATE jobs SET state = ?, updated = ? WHERE id = ?",
+                                 [(RUNNING, now, row[0]) for row in rows])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return [Job(*row) for row in rows]
+
+    def complete(self, job, result=None):
+        self._db.execute("UPDATE jobs SET state = ?, error = NULL, result = ?, updated = ? WHERE id = ?",
+                         (DONE, json.dumps(result, ensure_ascii=False), time.time(), job.id))
+
+    def fail(self, job, error, retry=True):
+        """Anotar un fallo: se reintenta más tarde o, agotados los intentos, queda como fallido"""
+        attempts = job.attempts + 1
+        now = time.time()
+        if retry and attempts < self.max_attempts:
+            delay = min(self.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+            self._db.execute("UPDATE jobs SET state = ?, attempts = ?, next_attempt = ?, error = ?, updated = ? "
+                             "WHERE id = ?", (PENDING, attempts, now + delay, error, now, job.id))
+            return True
+        self._db.execute("UPDATE jobs SET state = ?, attempts = ?, error = ?, updated = ? WHERE id = ?",
+                         (FAILED, attempts, error, now, job.id))
+        return False
+
+    def next_ready_in(self):
+        """Segundos hasta que haya un trabajo pendiente listo (None si no hay pendientes)"""
+        row = self._db.execute("SELECT MIN(next_attempt) FROM jobs WHERE state = ?", (PENDING,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def counts(self):
+        return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
@@ -0,0 +1,314 @@
+"""Unión de documentos ODT/DOCX parciales en un único documento.
+
+La conversión por ventanas de páginas genera un documento por ventana;
+aquí se concatenan sus cuerpos sin volver a pasar por pandoc ni por
+LibreOffice, de modo que la memoria usada depende del tamaño de cada
+parte y no del documento completo. Los estilos, la configuración y los
+metadatos se toman de la primera parte; los identificadores propios de
+cada parte (relaciones, imágenes, estilos automáticos) se renombran para
+que no choquen, y entre parte y parte se inserta un salto de página. Las
+imágenes idénticas en varias partes se guardan una sola vez.
+"""
+import hashlib
+import re
+import shutil
+import xml.etree.ElementTree as ET
+import zipfile
+
+_COPY_CHUNK_SIZE = 64 * 1024
+
+# --- DOCX ---
+
+_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_DOCX_DOCUMENT = "word/document.xml"
+_DOCX_RELS = "word/_rels/document.xml.rels"
+_DOCX_TYPES = "[Content_Types].xml"
+# Relaciones que pertenecen al contenido de cada parte (el resto son comunes)
+_DOCX_CONTENT_RELS = ("/image", "/hyperlink")
+
+_DOCX_BODY = re.compile(rb"<w:body\b[^>]*>")
+_DOCX_REL_ATTR = re.compile(rb'(r:(?:id|embed|link|pict))="([^"]+)"')
+_DOCX_DOC_PR_ID = re.compile(rb'(<wp:docPr\b[^>]*?\bid=")(\d+)"')
+_DOCX_PAGE_BREAK = b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# --- ODT ---
+
+_ODT_CONTENT = "content.xml"
+_ODT_MANIFEST = "META-INF/manifest.xml"
+_ODT_EMPTY_AUTO_STYLES = re.compile(rb"<office:automatic-styles\s*/>")
+_ODT_TEXT = re.compile(rb"<office:text((?:\s[^>]*?)?)(/?)>")
+_ODT_TEXT_PREAMBLE = re.compile(rb"<text:sequence-decls>.*?</text:sequence-decls>|<office:forms\b[^>]*/>", re.S)
+_ODT_STYLE_ATTR = re.compile(rb'([\w-]+:[\w-]*?name)="([^"]+)"')
+_ODT_STYLE_NAME = re.compile(rb'style:name="([^"]+)"')
+_ODT_PICTURE = re.compile(rb'xlink:href="Pictures/([^"]+)"')
+_ODT_MANIFEST_ENTRY = re.compile(rb"<manifest:file-entry\b[^>]*?/>", re.S)
+_ODT_MANIFEST_PATH = re.compile(rb'manifest:full-path="Pictures/([^"]+)"')
+_ODT_FO_NS = b'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"'
+_ODT_BREAK_STYLE = b"pdfexport-salto"
+_ODT_PAGE_BREAK = b'<text:p text:style-name="' + _ODT_BREAK_STYLE + b'"/>'
+
+
+class MergeError(Exception):
+    """Las partes no tienen la estructura esperada"""
+
+
+def _copy_entry(source, target, name, new_name=None):
+    with source.open(name) as entry_in, target.open(new_name or name, "w") as entry_out:
+        shutil.copyfileobj(entry_in, entry_out, _COPY_CHUNK_SIZE)
+
+
+def _entry_digest(source, name):
+    digest = hashlib.sha1()
+    with source.open(name) as entry_in:
+        for block in iter(lambda: entry_in.read(_COPY_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _part_prefix(index):
+    return f"p{index}-"
+
+
+def _docx_body(xml):
+    """Separar el documento en (cabecera, contenido del cuerpo, propiedades de sección final)"""
+    match = _DOCX_BODY.search(xml)
+    end = xml.rfind(b"</w:body>")
+    if match is None or end < 0:
+        raise MergeError("DOCX sin <w:body>")
+    body = xml[match.end():end]
+    # El sectPr de nivel de cuerpo es el último hijo; los de párrafo van dentro de <w:pPr>
+    sect = body.rfind(b"<w:sectPr")
+    if sect >= 0 and b"</w:p>" not in body[sect:] and b"</w:pPr>" not in body[sect:]:
+        return xml[:match.end()], body[:sect], body[sect:]
+    return xml[:match.end()], body, b""
+
+
+def _read_rels(source):
+    return ET.fromstring(source.read(_DOCX_RELS))
+
+
+def merge_docx(parts, target):
+    """Unir los DOCX de parts (en orden) en target"""
+    ET.register_namespace("", _RELS_NS)
+    with zipfile.ZipFile(parts[0]) as first:
+        head, _, section = _docx_body(first.read(_DOCX_DOCUMENT))
+        rels = _read_rels(first)
+        types = ET.fromstring(first.read(_DOCX_TYPES))
+        names = first.namelist()
+    extensions = {default.get("Extension").lower() for default in types.iter(f"{{{_TYPES_NS}}}Default")}
+    # Hash del contenido → ruta de la imagen ya incluida en el documento unido
+    with zipfile.ZipFile(parts[0]) as first:
+        media = {_entry_digest(first, "word/" + rel.get("Target")): rel.get("Target") for rel in rels
+                 if rel.get("Type", "").endswith("/image") and rel.get("TargetMode") != "External"}
+    doc_pr_ids = iter(range(1, 1 << 31))
+    # Imágenes de las partes: (parte, entrada original, entrada nueva); zipfile no
+    # permite escribir otra entrada mientras document.xml está abierto
+    copies = []
+
+    def renumber(body):
+        return _DOCX_DOC_PR_ID.sub(lambda m: m.group(1) + str(next(doc_pr_ids)).encode() + b'"', body)
+
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as out:
+        with out.open(_DOCX_DOCUMENT, "w") as document_out:
+            document_out.write(head)
+            for index, part in enumerate(parts):
+                with zipfile.ZipFile(part) as source:
+                    _, body, _ = _docx_body(source.read(_DOCX_DOCUMENT))
+                    if index:
+                        body = _merge_docx_part(source, part, body, index, rels, types, extensions, copies, media)
+                        document_out.write(_DOCX_PAGE_BREAK)
+                    document_out.write(renumber(body))
+                    del body
+            document_out.write(section + b"</w:body></w:document>")
+
+        for part, name, new_name in copies:
+            with zipfile.ZipFile(part) as source:
+                _copy_entry(source, out, name, new_name)
+        out.writestr(_DOCX_RELS, ET.tostring(rels, encoding="UTF-8", xml_declaration=True))
+        ET.register_namespace("", _TYPES_NS)
+        out.writestr(_DOCX_TYPES, ET.tostring(types, encoding="UTF-8", xml_declaration=True))
+        with zipfile.ZipFile(parts[0]) as first:
+            for name in names:
+                if name not in (_DOCX_DOCUMENT, _DOCX_RELS, _DOCX_TYPES):
+                    _copy_entry(first, out, name)
+    return target
+
+
+def _merge_docx_part(source, part, body, index, rels, types, extensions, copies, media):
+    """Añadir las relaciones e imágenes de una parte, renombradas; devuelve su cuerpo actualizado"""
+    prefix = _part_prefix(index)
+    renamed = {}
+    for rel in _read_rels(source):
+        if not rel.get("Type", "").endswith(_DOCX_CONTENT_RELS):
+            continue
+        rel_id = rel.get("Id")
+        renamed[rel_id.encode()] = (prefix + rel_id).encode()
+        rel.set("Id", prefix + rel_id)
+        if rel.get("TargetMode") != "External":
+            # Target es relativo a word/ (p. ej. media/imagen.png)
+            digest = _entry_digest(source, "word/" + rel.get("Target"))
+            if digest in media:
+                rel.set("Target", media[digest])
+                rels.append(rel)
+                continue
+            folder, _, name = rel.get("Target").rpartition("/")
+            new_target = f"{folder}/{prefix}{name}" if folder else prefix + name
+            copies.append((part, "word/" + rel.get("Target"), "word/" + new_target))
+            media[digest] = new_target
+            rel.set("Target", new_target)
+            extension = name.rpartition(".")[2].lower()
+            if extension not in extensions:
+                _add_default_type(source, types, extension)
+                extensions.add(extension)
+        rels.append(rel)
+    return _DOCX_REL_ATTR.sub(lambda m: m.group(1) + b'="' + renamed.get(m.group(2), m.group(2)) + b'"', body)
+
+
+def _add_default_type(source, types, extension):
+    for default in ET.fromstring(source.read(_DOCX_TYPES)).iter(f"{{{_TYPES_NS}}}Default"):
+        if default.get("Extension").lower() == extension:
+            types.insert(0, default)
+            return
+
+
+def _odt_sections(xml):
+    """Separar content.xml en (antes de estilos, estilos automáticos, entre ambos, texto, resto)"""
+    xml = _ODT_EMPTY_AUTO_STYLES.sub(b"<office:automatic-styles></office:automatic-styles>", xml, count=1)
+    auto = xml.find(b"<office:automatic-styles>")
+    auto_end = xml.find(b"</office:automatic-styles>")
+    text = _ODT_TEXT.search(xml)
+    if auto < 0 or auto_end < 0 or text is None:
+        raise MergeError("ODT sin <office:automatic-styles> u <office:text>")
+    if text.group(2):
+        # <office:text/> vacío
+        text_start = text_end = text.end()
+        rest = b"</office:text>" + xml[text.end():]
+        before_text = xml[auto_end:text.start()] + b"<office:text" + text.group(1) + b">"
+    else:
+        text_start = text.end()
+        text_end = xml.rfind(b"</office:text>")
+        rest = xml[text_end:]
+        before_text = xml[auto_end:text_start]
+    return (xml[:auto], xml[auto + len(b"<office:automatic-styles>"):auto_end],
+            before_text, xml[text_start:text_end], rest)
+
+
+def _rename_odt_styles(styles, text, suffix):
+    """Renombrar los estilos automáticos de una parte para que no choquen con los de las demás"""
+    names = set(_ODT_STYLE_NAME.findall(styles))
+
+    def rename(match):
+        attr, value = match.group(1), match.group(2)
+        if value in names and (attr == b"style:name" or attr.endswith(b"style-name")):
+            return attr + b'="' + value + suffix + b'"'
+        return match.group(0)
+
+    return _ODT_STYLE_ATTR.sub(rename, styles), _ODT_STYLE_ATTR.sub(rename, text)
+
+
+def _odt_part(source, index, pictures):
+    """Estilos automáticos y texto de una parte, con estilos e imágenes renombrados.
+
+    pictures asocia cada imagen de la parte con su nombre en el documento unido.
+    """
+    _, styles, _, text, _ = _odt_sections(source.read(_ODT_CONTENT))
+    if not index:
+        return styles, text
+    text = _ODT_TEXT_PREAMBLE.sub(b"", text)
+    styles, text = _rename_odt_styles(styles, text, b"_p%d" % index)
+    text = _ODT_PICTURE.sub(lambda m: b'xlink:href="Pictures/' + pictures.get(m.group(1), m.group(1)) + b'"', text)
+    return styles, text
+
+
+def _odt_pictures(source):
+    """Imágenes referenciadas en el texto de una parte"""
+    return set(_ODT_PICTURE.findall(_odt_sections(source.read(_ODT_CONTENT))[3]))
+
+
+def merge_odt(parts, target):
+    """Unir los ODT de parts (en orden) en target.
+
+    Se leen las partes varias veces: primero las imágenes, luego los
+    estilos automáticos (que deben preceder al texto) y por último el
+    texto, de modo que nunca hay más de una parte en memoria.
+    """
+    with zipfile.ZipFile(parts[0]) as first:
+        prefix, _, before_text, _, rest = _odt_sections(first.read(_ODT_CONTENT))
+        manifest = first.read(_ODT_MANIFEST)
+        names = first.namelist()
+    if b"xmlns:fo=" not in prefix:
+        prefix = prefix.replace(b"<office:document-content", b"<office:document-content " + _ODT_FO_NS, 1)
+    manifest_entries = []
+    # Imágenes de las partes: (parte, entrada original, entrada nueva)
+    copies = []
+    # Por parte, imagen → nombre en el documento unido; hash del contenido → nombre
+    part_pictures = [{} for _ in parts]
+    with zipfile.ZipFile(parts[0]) as first:
+        media = {_entry_digest(first, "Pictures/" + picture.decode()): picture for picture in _odt_pictures(first)}
+    for index, part in enumerate(parts[1:], start=1):
+        with zipfile.ZipFile(part) as source:
+            copied = set()
+            for picture in sorted(_odt_pictures(source)):
+                digest = _entry_digest(source, "Pictures/" + picture.decode())
+                if digest not in media:
+                    media[digest] = _part_prefix(index).encode() + picture
+                    copies.append((part, "Pictures/" + picture.decode(), "Pictures/" + media[digest].decode()))
+                    copied.add(picture)
+                part_pictures[index][picture] = media[digest]
+            for entry in _ODT_MANIFEST_ENTRY.findall(source.read(_ODT_MANIFEST)):
+                path = _ODT_MANIFEST_PATH.search(entry)
+                if path and path.group(1) in copied:
+                    manifest_entries.append(_ODT_MANIFEST_PATH.sub(
+                        lambda m: b'manifest:full-path="Pictures/' + part_pictures[index][m.group(1)] + b'"', entry))
+
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as out:
+        # mimetype debe ser la primera entrada y sin comprimir
+        with zipfile.ZipFile(parts[0]) as first:
+            out.writestr(zipfile.ZipInfo("mimetype"), first.read("mimetype"), zipfile.ZIP_STORED)
+
+        with out.open(_ODT_CONTENT, "w") as content_out:
+            content_out.write(prefix + b"<office:automatic-styles>")
+            content_out.write(b'<style:style style:name="' + _ODT_BREAK_STYLE + b'" style:family="paragraph">'
+                              b'<style:paragraph-properties fo:break-before="page"/></style:style>')
+            for index, part in enumerate(parts):
+                with zipfile.ZipFile(part) as source:
+                    styles, text = _odt_part(source, index, part_pictures[index])
+                content_out.write(styles)
+                del text
+
+            content_out.write(before_text)
+            for index, part in enumerate(parts):
+                with zipfile.ZipFile(part) as source:
+                    _, text = _odt_part(source, index, part_pictures[index])
+                if index:
+                    content_out.write(_ODT_PAGE_BREAK)
+                content_out.write(text)
+                del text
+            content_out.write(rest)
+
+        for part, name, new_name in copies:
+            with zipfile.ZipFile(part) as source:
+                _copy_entry(source, out, name, new_name)
+        end = manifest.rfind(b"</manifest:manifest>")
+        out.writestr(_ODT_MANIFEST, manifest[:end] + b"".join(manifest_entries) + manifest[end:])
+        with zipfile.ZipFile(parts[0]) as first:
+            for name in names:
+                if name not in ("mimetype", _ODT_CONTENT, _ODT_MANIFEST):
+                    _copy_entry(first, out, name)
+    return target
+
+
+def merge_documents(parts, target, output_format):
+    """Unir documentos parciales del mismo formato ("odt" o "docx") en target"""
+    if len(parts) == 1:
+        shutil.copyfile(parts[0], target)
+        return target
+    try:
+        if output_format == "docx":
+            return merge_docx(parts, target)
+        if output_format == "odt":
+            return merge_odt(parts, target)
+    except (KeyError, ValueError, ET.ParseError, zipfile.BadZipFile) as e:
+        raise MergeError(f"No se pudieron unir las partes {output_format.upper()}: {str(e)}") from e
+    raise MergeError(f"Formato no soportado para unir: {output_format}")
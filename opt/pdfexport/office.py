@@ -0,0 +1,355 @@
+"""Instancias persistentes de LibreOffice en modo servidor para convertir DOCX → DOC.
+
+Cada instancia usa su propio perfil de usuario, de modo que varias pueden
+convertir a la vez. Las conversiones se envían por UNO (python3-uno) si
+está disponible o, en su defecto, con unoconv conectándose al servidor ya
+arrancado, sin lanzar un LibreOffice nuevo por documento. Si una
+conversión supera su tiempo máximo o se cancela, la instancia se mata
+con todos sus procesos y se vuelve a arrancar para la siguiente.
+"""
+import atexit
+import multiprocessing.util
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import deps
+import runner
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+# Conversiones atendidas por una instancia antes de reiniciarla
+RESTART_AFTER_JOBS = 50
+# Segundos de espera a que una instancia acepte conexiones
+START_TIMEOUT = 45
+# Segundos de espera a que una instancia termine al cerrarla
+STOP_TIMEOUT = 10
+# Cada cuánto se comprueba la cancelación mientras se espera una instancia libre
+_ACQUIRE_POLL_SECONDS = 0.5
+# Cada cuánto comprueba el vigilante la cancelación y el tiempo máximo de una conversión
+_WATCHDOG_POLL_SECONDS = 0.2
+
+_FILTERS = {
+    "doc": "MS Word 97",
+    "docx": "MS Word 2007 XML",
+    "odt": "writer8",
+}
+
+
+class OfficeError(Exception):
+    """La instancia de LibreOffice no está disponible o la conversión falló"""
+
+
+def find_office_binary():
+    """Buscar el ejecutable de LibreOffice en el PATH"""
+    registry = deps.get_registry()
+    return registry.path("soffice") or registry.path("libreoffice")
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _prop(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class _Watchdog:
+    """Hilo que mata la instancia si la conversión supera su tiempo máximo o se cancela.
+
+    Las llamadas de UNO no tienen tiempo máximo ni se pueden interrumpir, y
+    si se mata el cliente unoconv el servidor sigue convirtiendo: la única
+    forma de pararlas es matar soffice. fired indica el motivo
+    ("timeout" o "cancelled") si el vigilante llegó a actuar.
+    """
+
+    def __init__(self, instance, control, timeout):
+        self.instance = instance
+        self.control = control
+        self.timeout = timeout
+        self.fired = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="pdfexport-office-watchdog", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+
+    def _watch(self):
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        while not self._done.wait(_WATCHDOG_POLL_SECONDS):
+            if self.control is not None and self.control.cancelled:
+                self.fired = "cancelled"
+            elif deadline is not None and time.monotonic() > deadline:
+                self.fired = "timeout"
+            else:
+                continue
+            self.instance.kill()
+            return
+
+
+class OfficeInstance:
+    """Un proceso soffice --headless escuchando en un puerto local"""
+
+    def __init__(self, binary):
+        self.binary = binary
+        self.process = None
+        self.port = None
+        self.profile_dir = None
+        self.jobs = 0
+        self._desktop = None
+
+    @property
+    def connection(self):
+        return f"socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+
+    def start(self):
+        self.profile_dir = tempfile.mkdtemp(prefix="pdfexport-lo-")
+        self.port = _free_port()
+        self.jobs = 0
+        self._desktop = None
+        cmd = [
+            self.binary, "--headless", "--invisible", "--nologo", "--norestore",
+            "--nodefault", "--nolockcheck",
+            f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+            f"--accept={self.connection}",
+        ]
+        try:
+            # Grupo de procesos propio para poder cerrar también los hijos de soffice
+            self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL, start_new_session=True)
+        except OSError as e:
+            self._remove_profile()
+            raise OfficeError(f"No se pudo iniciar LibreOffice: {str(e)}") from e
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.is_healthy():
+                return
+            if self.process.poll() is not None:
+                break
+            time.sleep(0.2)
+        self.stop()
+        raise OfficeError("LibreOffice no respondió al iniciarse")
+
+    def is_healthy(self):
+        """Comprobar que el proceso sigue vivo y acepta conexiones"""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def convert(self, source, target, target_format="doc"):
+        """Convertir source en target usando esta instancia.
+
+        Si la conversión supera el tiempo máximo de "soffice" o el trabajo
+        se cancela, la instancia se mata y se cierra; el pool la vuelve a
+        arrancar en la siguiente conversión.
+        """
+        if uno is None and not deps.get_registry().available("unoconv"):
+            raise OfficeError("Se necesita python3-uno o unoconv para usar LibreOffice")
+        control = runner.current()
+        if control is not None:
+            control.check()
+        timeout = (control.timeout_for("soffice") if control is not None
+                   else runner.DEFAULT_TIMEOUTS["soffice"])
+        watchdog = _Watchdog(self, control, timeout)
+        try:
+            with watchdog:
+                if uno is not None:
+                    self._convert_uno(source, target, target_format)
+                else:
+                    # El cliente tiene el mismo tiempo máximo: runner lo mata a la vez que el vigilante a soffice
+                    runner.run(["unoconv", "--connection", self.connection, "--no-launch",
+                                "-f", target_format, "-o", target, source], inputs=[source], outputs=[target],
+                               timeout=timeout)
+        except runner.Cancelled:
+            # unoconv se mató, pero soffice seguiría con la conversión
+            self.stop()
+            raise
+        except Exception as e:
+            if watchdog.fired == "cancelled":
+                self.stop()
+                raise runner.Cancelled("Conversión cancelada") from e
+            if watchdog.fired == "timeout" or isinstance(e, runner.StageTimeout):
+                self.stop()
+                raise OfficeError(f"LibreOffice superó el tiempo máximo de {timeout} s") from e
+            # Las excepciones de UNO no heredan de las de Python estándar
+            self._desktop = None
+            raise OfficeError(f"Error de conversión en LibreOffice: {str(e)}") from e
+        finally:
+            self.jobs += 1
+        if watchdog.fired is not None:
+            # El vigilante actuó cuando la conversión ya terminaba
+            self.stop()
+            if watchdog.fired == "cancelled":
+                raise runner.Cancelled("Conversión cancelada")
+        if not os.path.exists(target):
+            raise OfficeError("LibreOffice no generó el archivo de salida")
+
+    def _convert_uno(self, source, target, target_format):
+        if self._desktop is None:
+            local = uno.getComponentContext()
+            resolver = local.ServiceManager.createInstanceWithContext(
+                "com.sun.star.bridge.UnoUrlResolver", local)
+            ctx = resolver.resolve(f"uno:{self.connection}")
+            self._desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        doc = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(source)), "_blank", 0, (_prop("Hidden", True),))
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(target)),
+                           (_prop("FilterName", _FILTERS[target_format]),))
+        finally:
+            doc.close(True)
+
+    def kill(self):
+        """Matar el proceso y sus hijos sin esperar (lo usa el vigilante desde otro hilo)"""
+        process = self.process
+        if process is not None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        """Cerrar el proceso (y sus hijos) y borrar el perfil temporal"""
+        self._desktop = None
+        if self.process is not None and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+            except ProcessLookupError:
+                pass
+        self.process = None
+        self._remove_profile()
+
+    def _remove_profile(self):
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class OfficePool:
+    """Conjunto de instancias de LibreOffice reutilizadas entre conversiones"""
+
+    def __init__(self, size=1, restart_after=RESTART_AFTER_JOBS, binary=None):
+        self.size = max(1, size)
+        self.restart_after = restart_after
+        self.binary = binary
+        self._idle = queue.Queue()
+        self._instances = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def resize(self, size):
+        """Cambiar el número máximo de instancias (las que sobran no se cierran)"""
+        with self._lock:
+            self.size = max(1, size)
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise OfficeError("El pool de LibreOffice está cerrado")
+                if self._idle.empty() and len(self._instances) < self.size:
+                    binary = self.binary or find_office_binary()
+                    if binary is None:
+                        raise OfficeError("LibreOffice no está instalado")
+                    instance = OfficeInstance(binary)
+                    self._instances.append(instance)
+                    return instance
+            try:
+                return self._idle.get(timeout=_ACQUIRE_POLL_SECONDS)
+            except queue.Empty:
+                # Mientras se espera turno, el trabajo puede cancelarse
+                runner.check_cancelled()
+
+    def _release(self, instance):
+        self._idle.put(instance)
+
+    def convert(self, source, target, target_format="doc"):
+        """Convertir un documento con la primera instancia libre"""
+        instance = self._acquire()
+        try:
+            # Reiniciar las instancias caídas o que ya atendieron demasiados trabajos
+            if instance.process is not None and (
+                    instance.jobs >= self.restart_after or not instance.is_healthy()):
+                instance.stop()
+            if instance.process is None:
+                instance.start()
+            instance.convert(source, target, target_format)
+        finally:
+            self._release(instance)
+
+    def warm_up(self):
+        """Arrancar una instancia por adelantado para que la primera conversión sea rápida"""
+        instance = self._acquire()
+        try:
+            if instance.process is None:
+                instance.start()
+        finally:
+            self._release(instance)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            instances, self._instances = self._instances, []
+        for instance in instances:
+            instance.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(size=None):
+    """Obtener el pool compartido del proceso, creándolo si hace falta.
+
+    size es el número de instancias que puede tener a la vez (una por cada
+    conversión simultánea del proceso que pueda generar DOC); sin size se
+    conserva el actual, que empieza en una.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficePool(size or 1)
+            # atexit no se ejecuta en los procesos hijos de multiprocessing
+            atexit.register(_pool.shutdown)
+            multiprocessing.util.Finalize(_pool, _pool.shutdown, exitpriority=10)
+        elif size:
+            _pool.resize(size)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
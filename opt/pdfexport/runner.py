@@ -0,0 +1,242 @@
+"""Ejecución de las herramientas externas (poppler, pandoc, unoconv...).
+
+Cada herramienta se lanza en su propio grupo de procesos, con un tiempo
+máximo por etapa y, si se configuran, límites de CPU y memoria
+(prlimit). El trabajo activo (JobControl) se guarda en una variable de
+contexto, como el trazador, y permite cancelar la conversión: se matan
+los grupos de procesos en curso y no se lanzan más herramientas.
+"""
+import contextvars
+import os
+import resource
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+# Segundos máximos por llamada a cada herramienta
+DEFAULT_TIMEOUTS = {
+    "pdfinfo": 60,
+    "pdfimages": 300,
+    "pdftotext": 600,
+    "pdftocairo": 300,
+    "pandoc": 1800,
+    "unoconv": 600,
+    # Conversiones enviadas a una instancia de LibreOffice (office.py)
+    "soffice": 600,
+}
+DEFAULT_TIMEOUT = 900
+# Cada cuánto se comprueba la cancelación mientras una herramienta trabaja
+_POLL_INTERVAL = 0.2
+# Segundos entre SIGTERM y SIGKILL al matar un grupo de procesos
+_KILL_GRACE = 2
+
+_current = contextvars.ContextVar("pdfexport_job", default=None)
+
+
+class Cancelled(Exception):
+    """La conversión se canceló"""
+
+
+class StageTimeout(subprocess.CalledProcessError):
+    """La herramienta superó su tiempo máximo y se mató.
+
+    Hereda de CalledProcessError para que los métodos de conversión la
+    traten como cualquier otro fallo de la herramienta.
+    """
+
+    def __init__(self, cmd, timeout, output=None, stderr=None):
+        super().__init__(-signal.SIGKILL, cmd, output, stderr)
+        self.timeout = timeout
+
+    def __str__(self):
+        return f"'{self.cmd[0]}' superó el tiempo máximo de {self.timeout} s"
+
+
+class JobControl:
+    """Límites, cancelación y progreso de las herramientas lanzadas por un trabajo"""
+
+    def __init__(self, on_progress=None):
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.default_timeout = DEFAULT_TIMEOUT
+        self.cpu_seconds = None
+        self.memory_bytes = None
+        # on_progress(hechas, total) recibe el avance en unidades de trabajo (páginas)
+        self.on_progress = on_progress
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+        # Herramientas lanzadas por este trabajo (aunque otros trabajos corran en el mismo proceso)
+        self.subprocesses = 0
+        self._done = 0
+        self._total = 0
+
+    def configure(self, timeout=None, cpu_seconds=None, memory_bytes=None):
+        """Fijar un tiempo máximo común (en lugar de los de cada herramienta) y los límites"""
+        if timeout:
+            self.timeouts = {}
+            self.default_timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+
+    def timeout_for(self, tool):
+        return self.timeouts.get(tool, self.default_timeout)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Cancelar el trabajo: matar las herramientas en curso y no lanzar más"""
+        self._cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            _kill_group(process)
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled("Conversión cancelada")
+
+    def set_total(self, total):
+        with self._lock:
+            self._total = total
+            self._done = min(self._done, total)
+        self._report()
+
+    def advance(self, amount=1):
+        with self._lock:
+            self._done = min(self._done + amount, self._total)
+        self._report()
+
+    def _report(self):
+        if self.on_progress is not None:
+            with self._lock:
+                done, total = self._done, self._total
+            self.on_progress(done, total)
+
+    def _register(self, process):
+        with self._lock:
+            self._processes.add(process)
+
+    def _unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+
+def current():
+    """Trabajo activo en este contexto (o None)"""
+    return _current.get()
+
+
+@contextmanager
+def activate(control):
+    token = _current.set(control)
+    try:
+        yield control
+    finally:
+        _current.reset(token)
+
+
+def check_cancelled():
+    """Lanzar Cancelled si el trabajo activo se canceló"""
+    control = current()
+    if control is not None:
+        control.check()
+
+
+def advance(amount=1):
+    """Anotar trabajo hecho en el progreso del trabajo activo"""
+    control = current()
+    if control is not None:
+        control.advance(amount)
+
+
+def _limit_resources(process, cpu_seconds, memory_bytes):
+    """Aplicar los límites a la herramienta ya lanzada.
+
+    Se usa prlimit desde el padre y no un preexec_fn, que no es seguro con
+    varios hilos (las conversiones por páginas y el servidor HTTP los usan).
+    """
+    try:
+        if cpu_seconds:
+            # Al superar el límite blando llega SIGXCPU; el duro mata el proceso
+            resource.prlimit(process.pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if memory_bytes:
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    except ProcessLookupError:
+        # La herramienta ya terminó
+        pass
+
+
+def _kill_group(process):
+    """Matar la herramienta y todos sus hijos (su grupo de procesos)"""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            process.wait(_KILL_GRACE)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def run(cmd, check=True, stage=None, inputs=(), outputs=(), timeout=None, **info):
+    """Ejecutar una herramienta externa capturando su salida.
+
+    Con un trazador activo la llamada se registra como la etapa `stage`
+    (por defecto, el nombre de la herramienta) con el tamaño de inputs y
+    outputs, más los datos adicionales de info. Si supera su tiempo máximo
+    se mata y se lanza StageTimeout; si el trabajo se cancela, Cancelled.
+    """
+    control = current()
+    if control is not None:
+        control.check()
+        with control._lock:
+            control.subprocesses += 1
+    tool = os.path.basename(cmd[0])
+    if timeout is None:
+        timeout = control.timeout_for(tool) if control is not None else DEFAULT_TIMEOUTS.get(tool, DEFAULT_TIMEOUT)
+
+    with tracing.stage(stage or tool, inputs, outputs, tool=tool, **info) as record:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, start_new_session=True)
+        if control is not None:
+            control._register(process)
+            if control.cpu_seconds or control.memory_bytes:
+                _limit_resources(process, control.cpu_seconds, control.memory_bytes)
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=_POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if control is not None and control.cancelled:
+                        _kill_group(process)
+                        process.communicate()
+                        record["cancelled"] = True
+                        raise Cancelled("Conversión cancelada")
+                    if deadline is not None and time.monotonic() > deadline:
+                        _kill_group(process)
+                        stdout, stderr = process.communicate()
+                        record["timeout"] = timeout
+                        raise StageTimeout(cmd, timeout, stdout, stderr)
+        except BaseException:
+            if process.poll() is None:
+                _kill_group(process)
+            raise
+        finally:
+            if control is not None:
+                control._unregister(process)
+        record["returncode"] = process.returncode
+        if control is not None and control.cancelled:
+            raise Cancelled("Conversión cancelada")
+        if check and process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
@@ -0,0 +1,488 @@
+"""Servicio HTTP local de conversión (asyncio, sin dependencias externas).
+
+Pensado para que otras herramientas del mismo equipo conviertan PDF sin
+lanzar la interfaz gráfica. Escucha en localhost o en un socket Unix:
+
+    POST /convert?format=docx&name=informe.pdf   cuerpo: el PDF
+    POST /convert   cuerpo JSON: {"path": "/ruta/al.pdf", "format": "odt"}
+    GET  /metrics   métricas en formato de texto de Prometheus
+    GET  /health    estado del servicio y dependencias que faltan
+
+La respuesta de /convert es el documento convertido, enviado por bloques.
+Las conversiones se ejecutan en hilos del mismo proceso para compartir el
+pool de LibreOffice y el registro de dependencias entre peticiones. Un
+semáforo limita las conversiones simultáneas y, si ya hay demasiadas
+peticiones esperando, se responde 503. Si el cliente se desconecta, la
+conversión se cancela.
+"""
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import deps
+import engine
+import office
+import runner
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_MAX_UPLOAD_MB = 512
+# Límites superiores (en segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_CHUNK_SIZE = 64 * 1024
+_MAX_HEADER_BYTES = 64 * 1024
+_CONTENT_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "odt": "application/vnd.oasis.opendocument.text",
+    "doc": "application/msword",
+}
+_REASONS = {
+    200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    499: "Client Closed Request", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """Error que se devuelve al cliente con su código HTTP"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class _Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def render(self, name, labels=""):
+        lines = []
+        separator = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Contadores e histogramas del servicio; sólo se tocan desde el bucle de eventos"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {}
+        self.conversions = {}
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.rejected = 0
+        self.cancelled = 0
+        # Tiempo total de cada petición de conversión, por formato
+        self.latency = {}
+        # Tiempo esperando turno (semáforo) antes de empezar a convertir
+        self.queue_wait = _Histogram()
+        self.running = 0
+        self.waiting = 0
+
+    def count_request(self, path, status):
+        key = (path, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def count_conversion(self, output_format, method, cached, seconds):
+        key = (output_format, method, cached)
+        self.conversions[key] = self.conversions.get(key, 0) + 1
+        self.latency.setdefault(output_format, _Histogram()).observe(seconds)
+
+    def render(self):
+        lines = [
+            "# TYPE pdfexport_uptime_seconds gauge",
+            f"pdfexport_uptime_seconds {time.time() - self.started:.3f}",
+            "# TYPE pdfexport_requests_total counter",
+        ]
+        for (path, status), count in sorted(self.requests.items()):
+            lines.append(f'pdfexport_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines.append("# TYPE pdfexport_conversions_total counter")
+        for (output_format, method, cached), count in sorted(self.conversions.items()):
+            lines.append(f'pdfexport_conversions_total{{format="{output_format}",method="{method}",'
+                         f'cached="{str(cached).lower()}"}} {count}')
+        lines += [
+            "# TYPE pdfexport_input_bytes_total counter",
+            f"pdfexport_input_bytes_total {self.input_bytes}",
+            "# TYPE pdfexport_output_bytes_total counter",
+            f"pdfexport_output_bytes_total {self.output_bytes}",
+            "# TYPE pdfexport_rejected_total counter",
+            f"pdfexport_rejected_total {self.rejected}",
+            "# TYPE pdfexport_cancelled_total counter",
+            f"pdfexport_cancelled_total {self.cancelled}",
+            "# TYPE pdfexport_running gauge",
+            f"pdfexport_running {self.running}",
+            "# TYPE pdfexport_waiting gauge",
+            f"pdfexport_waiting {self.waiting}",
+            "# TYPE pdfexport_conversion_seconds histogram",
+        ]
+        for output_format, histogram in sorted(self.latency.items()):
+            lines += histogram.render("pdfexport_conversion_seconds", f'format="{output_format}"')
+        lines.append("# TYPE pdfexport_queue_wait_seconds histogram")
+        lines += self.queue_wait.render("pdfexport_queue_wait_seconds")
+        return "\n".join(lines) + "\n"
+
+
+class ConversionServer:
+    """Servidor HTTP/1.1 mínimo (una petición por conexión) sobre asyncio"""
+
+    def __init__(self, options=None, jobs=None, max_queue=DEFAULT_MAX_QUEUE,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024, path_roots=(), warm_office=False,
+                 office_instances=None, log=print):
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.options = (options or engine.ConversionOptions()).for_jobs(self.jobs)
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        # Carpetas desde las que se aceptan conversiones por ruta (ninguna: sólo subidas)
+        self.path_roots = [os.path.realpath(root) for root in path_roots]
+        self.warm_office = warm_office
+        # Instancias de LibreOffice para DOC: por defecto una por conversión simultánea
+        self.office_instances = max(1, office_instances or self.jobs)
+        self.log = log
+        self.metrics = Metrics()
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="pdfexport")
+        self._semaphore = None
+        self._server = None
+        self._connections = set()
+        self._unix_socket = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        self._semaphore = asyncio.Semaphore(self.jobs)
+        # Recursos compartidos por todas las peticiones: versiones de las herramientas y LibreOffice
+        registry = deps.get_registry()
+        registry.start_probes()
+        missing = registry.missing(required=True)
+        if missing:
+            self.log(f"Faltan dependencias: {', '.join(missing)}")
+        office.get_pool(self.office_instances)
+        if self.warm_office:
+            threading.Thread(target=self._warm_up_office, daemon=True).start()
+
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self._server = await asyncio.start_unix_server(self._handle, path=unix_socket,
+                                                           limit=_MAX_HEADER_BYTES)
+            os.chmod(unix_socket, 0o660)
+            self._unix_socket = unix_socket
+            self.log(f"Escuchando en {unix_socket}")
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=_MAX_HEADER_BYTES)
+            self.log(f"Escuchando en http://{host}:{port}")
+
+    def _warm_up_office(self):
+        try:
+            office.get_pool().warm_up()
+        except office.OfficeError as e:
+            self.log(f"No se pudo arrancar LibreOffice: {str(e)}")
+
+    async def serve_until_stopped(self):
+        """Atender peticiones hasta SIGINT/SIGTERM; las conversiones en curso se terminan"""
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopped.set)
+        try:
+            await stopped.wait()
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._unix_socket is not None and os.path.exists(self._unix_socket):
+            os.unlink(self._unix_socket)
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        office.shutdown_pool()
+        self.log("Servicio detenido")
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        path = "-"
+        status = 500
+        try:
+            method, path, query, headers = await self._read_head(reader)
+            status = await self._route(method, path, query, headers, reader, writer)
+        except HttpError as e:
+            status = e.status
+            await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = 499
+        except Exception as e:
+            status = 500
+            await self._send_json(writer, 500, {"error": f"Error inesperado: {str(e)}"})
+        finally:
+            if path.startswith("/"):
+                self.metrics.count_request(path if path in ("/convert", "/metrics", "/health") else "other",
+                                           status)
+            self._connections.discard(task)
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "Cabeceras demasiado grandes")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Petición mal formada")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), headers
+
+    async def _route(self, method, path, query, headers, reader, writer):
+        if path == "/metrics":
+            self._require_method(method, "GET")
+            await self._send(writer, 200, self.metrics.render().encode("utf-8"),
+                             {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+            return 200
+        if path == "/health":
+            self._require_method(method, "GET")
+            registry = deps.get_registry()
+            await self._send_json(writer, 200, {
+                "status": "ok",
+                "missing": registry.missing(required=True),
+                "optional_missing": registry.missing(required=False),
+                "running": self.metrics.running,
+                "waiting": self.metrics.waiting,
+            })
+            return 200
+        if path == "/convert":
+            self._require_method(method, "POST")
+            return await self._convert(query, headers, reader, writer)
+        raise HttpError(404, f"Ruta desconocida: {path}")
+
+    @staticmethod
+    def _require_method(method, expected):
+        if method != expected:
+            raise HttpError(405, f"Método no permitido: {method}", {"Allow": expected})
+
+    async def _convert(self, query, headers, reader, writer):
+        # Rechazar antes de leer la subida si la cola ya está llena
+        if self.metrics.waiting >= self.max_queue:
+            self.metrics.rejected += 1
+            raise HttpError(503, "Demasiadas conversiones en espera", {"Retry-After": "5"})
+        self.metrics.waiting += 1
+        waiting = True
+        work_dir = tempfile.mkdtemp(prefix="pdfexport-server-")
+        try:
+            pdf_file, output_format = await self._read_job(query, headers, reader, writer, work_dir)
+            disconnected = asyncio.ensure_future(_wait_disconnect(reader))
+            try:
+                queued = time.monotonic()
+                acquire = asyncio.ensure_future(self._semaphore.acquire())
+                await asyncio.wait({acquire, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    if acquire.done():
+                        self._semaphore.release()
+                    else:
+                        acquire.cancel()
+                    self.metrics.cancelled += 1
+                    return 499
+                self.metrics.queue_wait.observe(time.monotonic() - queued)
+                self.metrics.waiting -= 1
+                waiting = False
+                self.metrics.running += 1
+                try:
+                    result = await self._run_conversion(pdf_file, output_format, work_dir, disconnected)
+                finally:
+                    self.metrics.running -= 1
+                    self._semaphore.release()
+            finally:
+                disconnected.cancel()
+            if result is None:
+                self.metrics.cancelled += 1
+                return 499
+            self.metrics.count_conversion(output_format, result.method, result.cached,
+                                          time.monotonic() - queued)
+            await self._send_file(writer, result, output_format)
+            return 200
+        finally:
+            if waiting:
+                self.metrics.waiting -= 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def _read_job(self, query, headers, reader, writer, work_dir):
+        """Leer la petición de conversión; devuelve (ruta del PDF, formato)"""
+        output_format = query.get("format", ["docx"])[0]
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            raise HttpError(411, "Se necesita Content-Length")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            raise HttpError(411, "Se necesita Content-Length")
+
+        if headers.get("content-type", "").split(";")[0].strip() == "application/json":
+            if length > _MAX_HEADER_BYTES:
+                raise HttpError(413, "Petición JSON demasiado grande")
+            await _send_continue(headers, writer)
+            try:
+                body = json.loads(await reader.readexactly(length))
+                pdf_file = body["path"]
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, 'Se esperaba un JSON con "path"')
+            output_format = body.get("format", output_format)
+            self._check_format(output_format)
+            return self._allowed_path(pdf_file), output_format
+
+        self._check_format(output_format)
+        if length > self.max_upload_bytes:
+            raise HttpError(413, f"El PDF supera el máximo de {self.max_upload_bytes // (1024 * 1024)} MB")
+        name = os.path.basename(query.get("name", ["documento.pdf"])[0]) or "documento.pdf"
+        if not name.lower().endswith(".pdf"):
+            name += ".pdf"
+        pdf_file = os.path.join(work_dir, name)
+        await _send_continue(headers, writer)
+        remaining = length
+        with open(pdf_file, "wb") as f:
+            while remaining:
+                block = await reader.read(min(_CHUNK_SIZE, remaining))
+                if not block:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                f.write(block)
+                remaining -= len(block)
+        self.metrics.input_bytes += length
+        return pdf_file, output_format
+
+    @staticmethod
+    def _check_format(output_format):
+        if output_format not in engine.FORMATS:
+            raise HttpError(400, f"Formato no soportado: {output_format}")
+
+    def _allowed_path(self, pdf_file):
+        if not self.path_roots:
+            raise HttpError(403, "Las conversiones por ruta no están habilitadas")
+        real = os.path.realpath(pdf_file)
+        if not os.path.isabs(pdf_file) or not any(
+                os.path.commonpath([real, root]) == root for root in self.path_roots):
+            raise HttpError(403, f"Ruta no permitida: {pdf_file}")
+        if not os.path.isfile(real):
+            raise HttpError(404, f"El archivo no existe: {pdf_file}")
+        self.metrics.input_bytes += os.path.getsize(real)
+        return real
+
+    async def _run_conversion(self, pdf_file, output_format, work_dir, disconnected):
+        """Convertir en un hilo; devuelve el ConversionResult o None si el cliente se fue"""
+        control = runner.JobControl()
+        output_dir = os.path.join(work_dir, "salida")
+        os.makedirs(output_dir)
+        loop = asyncio.get_running_loop()
+        conversion = loop.run_in_executor(self._executor, engine.export_pdf, pdf_file, output_dir,
+                                          [output_format], None, self.options, control)
+        await asyncio.wait({conversion, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if not conversion.done():
+            # El cliente cerró la conexión: detener las herramientas y esperar a que el hilo acabe
+            control.cancel()
+            await asyncio.wait({conversion})
+        try:
+            return conversion.result()[0]
+        except engine.ConversionCancelled:
+            return None
+        except engine.ConversionError as e:
+            raise HttpError(422, str(e))
+
+    async def _send_file(self, writer, result, output_format):
+        size = os.path.getsize(result.output_path)
+        name = os.path.basename(result.output_path)
+        writer.write(self._head(200, {
+            "Content-Type": _CONTENT_TYPES[output_format],
+            "Content-Length": str(size),
+            "Content-Disposition": f'attachment; filename="{name}"',
+            "X-Pdfexport-Method": result.method,
+            "X-Pdfexport-Cached": str(result.cached).lower(),
+        }))
+        with open(result.output_path, "rb") as f:
+            for block in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                writer.write(block)
+                await writer.drain()
+        self.metrics.output_bytes += size
+
+    @staticmethod
+    def _head(status, headers):
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append("Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", "replace")
+
+    async def _send(self, writer, status, body, headers):
+        headers = dict(headers, **{"Content-Length": str(len(body))})
+        writer.write(self._head(status, headers) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        try:
+            await self._send(writer, status, body, dict(headers or {}, **{"Content-Type": "application/json"}))
+        except (ConnectionError, OSError):
+            pass
+
+
+async def _send_continue(headers, writer):
+    """Responder a "Expect: 100-continue" una vez aceptada la petición.
+
+    curl lo envía en las subidas grandes y, sin respuesta, espera un
+    segundo antes de mandar el cuerpo.
+    """
+    if headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+
+
+async def _wait_disconnect(reader):
+    """Terminar cuando el cliente cierre la conexión (se descarta lo que envíe de más)"""
+    try:
+        while await reader.read(_CHUNK_SIZE):
+            pass
+    except (ConnectionError, OSError):
+        pass
+
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, **kwargs):
+    """Arrancar el servicio HTTP hasta recibir SIGINT o SIGTERM"""
+    async def main():
+        server = ConversionServer(**kwargs)
+        await server.start(host, port, unix_socket)
+        await server.serve_until_stopped()
+
+    asyncio.run(main())
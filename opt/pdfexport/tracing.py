@@ -0,0 +1,157 @@
+"""Medición por etapas de una conversión y trazas JSON.
+
+Cada etapa (llamada a una herramienta externa o paso en Python) registra
+su tiempo real, el tiempo de CPU de los procesos hijos y del propio
+proceso, el pico de memoria de los hijos (resource.getrusage) y el tamaño
+de sus archivos de entrada y salida. El trazador activo se guarda en una
+variable de contexto, de modo que runner.run lo encuentra sin tener que
+pasarlo por todas las funciones; los pools de hilos deben lanzar sus
+tareas con wrap() para heredarlo.
+
+Si varias etapas se ejecutan en paralelo, los deltas de CPU de hijos de
+cada una incluyen también a los hijos de las etapas simultáneas.
+"""
+import contextvars
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("pdfexport_tracer", default=None)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+def _cpu(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+class Tracer:
+    """Registro de las etapas de un trabajo de conversión"""
+
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self._start = time.monotonic()
+        self.stages = []
+        self.info = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, inputs=(), outputs=(), **info):
+        """Medir el bloque como una etapa; los tamaños de outputs se leen al terminar"""
+        record = {"stage": name, "start": round(time.monotonic() - self._start, 6)}
+        record.update(info)
+        record["input_bytes"] = sum(_size(path) or 0 for path in inputs)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.monotonic()
+        try:
+            yield record
+            record.setdefault("ok", True)
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = str(e)[:500]
+            raise
+        finally:
+            record["wall"] = round(time.monotonic() - start, 6)
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            own_end = resource.getrusage(resource.RUSAGE_SELF)
+            record["child_cpu"] = round(_cpu(children_end) - _cpu(children), 6)
+            record["self_cpu"] = round(_cpu(own_end) - _cpu(own), 6)
+            # ru_maxrss es el máximo histórico (en KB en Linux), no un delta
+            record["child_peak_rss_kb"] = children_end.ru_maxrss
+            record["self_peak_rss_kb"] = own_end.ru_maxrss
+            record["output_bytes"] = sum(_size(path) or 0 for path in outputs)
+            with self._lock:
+                self.stages.append(record)
+
+    def set(self, **info):
+        with self._lock:
+            self.info.update(info)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "job": self.job,
+                "started": self.started,
+                "wall": round(time.monotonic() - self._start, 6),
+                "info": dict(self.info),
+                "stages": sorted(self.stages, key=lambda record: record["start"]),
+            }
+
+    def write(self, path):
+        data = self.as_dict()
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(data, out, ensure_ascii=False, indent=2)
+        return data
+
+
+def current():
+    """Trazador activo en este contexto (o None)"""
+    return _current.get()
+
+
+@contextmanager
+def activate(tracer):
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name, inputs=(), outputs=(), **info):
+    """Medir una etapa con el trazador activo; sin trazador no hace nada"""
+    tracer = current()
+    if tracer is None:
+        yield {}
+        return
+    with tracer.stage(name, inputs, outputs, **info) as record:
+        yield record
+
+
+def wrap(fn):
+    """Envolver fn para que se ejecute en otro hilo con el contexto (y el trazador) actual"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def aggregate(traces):
+    """Resumir varias trazas: totales por etapa y métodos de conversión usados"""
+    stages = {}
+    methods = {}
+    for trace in traces:
+        for record in trace.get("stages", []):
+            totals = stages.setdefault(record["stage"], {
+                "count": 0, "failed": 0, "wall": 0.0, "max_wall": 0.0, "child_cpu": 0.0,
+                "max_child_peak_rss_kb": 0, "input_bytes": 0, "output_bytes": 0,
+            })
+            totals["count"] += 1
+            totals["failed"] += 0 if record.get("ok", True) else 1
+            totals["wall"] += record.get("wall", 0.0)
+            totals["max_wall"] = max(totals["max_wall"], record.get("wall", 0.0))
+            totals["child_cpu"] += record.get("child_cpu", 0.0)
+            totals["max_child_peak_rss_kb"] = max(totals["max_child_peak_rss_kb"],
+                                                  record.get("child_peak_rss_kb", 0))
+            totals["input_bytes"] += record.get("input_bytes", 0)
+            totals["output_bytes"] += record.get("output_bytes", 0)
+        for method in trace.get("info", {}).get("methods", {}).values():
+            methods[method] = methods.get(method, 0) + 1
+    for totals in stages.values():
+        totals["mean_wall"] = totals["wall"] / totals["count"]
+    return {
+        "jobs": len(traces),
+        "failed": sum(1 for trace in traces if trace.get("info", {}).get("error")),
+        "wall": sum(trace.get("wall", 0.0) for trace in traces),
+        "methods": methods,
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["wall"])),
+    }
@@ -0,0 +1,272 @@
+"""Modo servicio: vigilar una carpeta y convertir los PDF que van llegando.
+
+Los archivos nuevos se detectan con inotify (o, si no está disponible,
+revisando la carpeta periódicamente). Un archivo sólo se encola cuando
+lleva `settle` segundos sin cambiar de tamaño ni de fecha y termina en
+%%EOF, para no convertir PDF a medio copiar. La cola es persistente
+(jobqueue.py) y los archivos se convierten en un pool de procesos con
+como máximo `jobs` conversiones simultáneas.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import batch
+import engine
+import jobqueue
+
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_SECONDS = 5.0
+# Con inotify también se revisa la carpeta de vez en cuando (eventos perdidos, NFS/SMB)
+_INOTIFY_RESCAN_SECONDS = 60.0
+# Sin %%EOF al final, un archivo estable se encola igualmente tras settle × este factor
+_NO_EOF_SETTLE_FACTOR = 10
+_EOF_TAIL_BYTES = 1024
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Avisos de inotify para una carpeta (archivos cerrados tras escribir o movidos a ella)"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch")
+        self.directory = directory
+
+    def wait(self, timeout):
+        """Esperar eventos; devuelve (rutas, desbordado)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+        paths = []
+        overflow = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                paths.append(os.path.join(self.directory, os.fsdecode(name)))
+        return paths, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _has_eof(path):
+    """Comprobar que el PDF termina con el marcador %%EOF (está escrito del todo)"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - _EOF_TAIL_BYTES))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class WatchDaemon:
+    """Vigila watch_dir, encola los PDF terminados y los convierte en output_dir"""
+
+    def __init__(self, watch_dir, output_dir, formats=("docx",), jobs=None, options=None, db_path=None,
+                 settle=DEFAULT_SETTLE_SECONDS, poll=DEFAULT_POLL_SECONDS,
+                 max_attempts=jobqueue.DEFAULT_MAX_ATTEMPTS, on_result=None, log=print):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = output_dir
+        self.formats = list(formats)
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.options = (options or engine.ConversionOptions()).for_jobs(self.jobs)
+        self.db_path = db_path or os.path.join(output_dir, ".pdfexport-queue.sqlite")
+        self.settle = settle
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.on_result = on_result
+        self.log = log
+        # Ruta → (tamaño, mtime_ns, desde cuándo no cambia)
+        self._candidates = {}
+        self._stop = False
+
+    def stop(self, *_):
+        self._stop = True
+
+    def _observe(self, path):
+        """Anotar el estado actual de un posible PDF nuevo"""
+        if not path.lower().endswith(".pdf"):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._candidates.pop(path, None)
+            return
+        key = (stat.st_size, stat.st_mtime_ns)
+        previous = self._candidates.get(path)
+        if previous is None or previous[:2] != key:
+            self._candidates[path] = key + (time.monotonic(),)
+
+    def _scan(self, queue):
+        try:
+            entries = list(os.scandir(self.watch_dir))
+        except OSError as e:
+            self.log(f"No se puede leer {self.watch_dir}: {str(e)}")
+            return
+        for entry in entries:
+            if not entry.name.lower().endswith(".pdf") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.path not in self._candidates and queue.contains(entry.path, stat.st_size, stat.st_mtime_ns):
+                continue
+            self._observe(entry.path)
+
+    def _settled(self):
+        """Sacar de los candidatos los archivos ya terminados; devuelve [(ruta, tamaño, mtime_ns)]"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime_ns, since) in list(self._candidates.items()):
+            self._observe(path)
+            if self._candidates.get(path) != (size, mtime_ns, since) or now - since < self.settle:
+                continue
+            if not size:
+                continue
+            if _has_eof(path) or now - since >= self.settle * _NO_EOF_SETTLE_FACTOR:
+                ready.append((path, size, mtime_ns))
+                del self._candidates[path]
+        return ready
+
+    def run(self):
+        """Bucle principal; termina con SIGINT/SIGTERM tras acabar las conversiones en curso"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        queue = jobqueue.JobQueue(self.db_path, self.max_attempts)
+        recovered = queue.recover()
+        if recovered:
+            self.log(f"{recovered} trabajos interrumpidos vuelven a la cola")
+        try:
+            watcher = _Inotify(self.watch_dir)
+            rescan_every = _INOTIFY_RESCAN_SECONDS
+        except (OSError, AttributeError):
+            watcher = None
+            rescan_every = self.poll
+            self.log("inotify no disponible; se revisará la carpeta periódicamente")
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+        self.log(f"Vigilando {self.watch_dir} -> {self.output_dir}")
+        in_flight = {}
+        last_scan = None
+        pool = ProcessPoolExecutor(max_workers=self.jobs)
+        try:
+            while not self._stop or in_flight:
+                if not self._stop:
+                    if last_scan is None or time.monotonic() - last_scan >= rescan_every:
+                        self._scan(queue)
+                        last_scan = time.monotonic()
+                    ready = self._settled()
+                    if ready:
+                        added = queue.enqueue(ready)
+                        if added:
+                            self.log(f"{added} archivos añadidos a la cola")
+                    # Mantener dos trabajos por proceso en vuelo
+                    free = self.jobs * 2 - len(in_flight)
+                    for job in queue.claim(free) if free > 0 else []:
+                        if not os.path.isfile(job.path):
+                            queue.fail(job, "El archivo ya no existe", retry=False)
+                            continue
+                        future = pool.submit(batch.convert_one, job.path, self.output_dir,
+                                             self.formats, self.options)
+                        in_flight[future] = job
+
+                timeout = self._timeout(queue, in_flight, rescan_every, last_scan)
+                if in_flight:
+                    # Con inotify, los eventos de la carpeta se atienden abajo
+                    if self._stop:
+                        wait_timeout = None
+                    else:
+                        wait_timeout = 0 if watcher is not None else timeout
+                    done, _ = wait(in_flight, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        job = in_flight.pop(future)
+                        try:
+                            summary = future.result()
+                        except BrokenProcessPool:
+                            broken = True
+                            summary = self._crashed(job)
+                        self._finish(queue, job, summary)
+                    if broken:
+                        # Un proceso del pool murió (OOM, fallo en una herramienta): no se sabe con
+                        # qué archivo, así que todos los trabajos en vuelo cuentan un intento
+                        self.log("Un proceso de conversión terminó de forma inesperada; se reinicia el pool")
+                        for job in in_flight.values():
+                            self._finish(queue, job, self._crashed(job))
+                        in_flight.clear()
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=self.jobs)
+                if self._stop:
+                    continue
+                if watcher is not None:
+                    paths, overflow = watcher.wait(timeout if not in_flight else min(timeout, 0.5))
+                    for path in paths:
+                        self._observe(path)
+                    if overflow:
+                        last_scan = None
+                elif not in_flight:
+                    time.sleep(timeout)
+        finally:
+            pool.shutdown()
+            if watcher is not None:
+                watcher.close()
+            counts = queue.counts()
+            queue.close()
+        self.log("Servicio detenido. " + ", ".join(f"{state}: {count}" for state, count in sorted(counts.items())))
+        return counts
+
+    def _timeout(self, queue, in_flight, rescan_every, last_scan):
+        """Cuánto se puede esperar sin retrasar nada: candidatos, reintentos o la próxima revisión"""
+        timeout = rescan_every - (time.monotonic() - last_scan) if last_scan is not None else 0
+        if self._candidates:
+            timeout = min(timeout, self.settle / 2)
+        if len(in_flight) < self.jobs * 2:
+            ready_in = queue.next_ready_in()
+            if ready_in is not None:
+                timeout = min(timeout, ready_in)
+        # Despertar al menos una vez por segundo para atender SIGINT/SIGTERM
+        return max(0.05, min(timeout, 1.0))
+
+    def _crashed(self, job):
+        """Resumen de un trabajo perdido porque su proceso murió"""
+        return {"pdf_file": job.path, "formats": self.formats, "ok": False,
+                "error": "El proceso de conversión terminó de forma inesperada"}
+
+    def _finish(self, queue, job, summary):
+        if summary["ok"]:
+            queue.complete(job, summary)
+        elif queue.fail(job, summary["error"]):
+            summary["error"] += " (se reintentará)"
+        if self.on_result is not None:
+            self.on_result(summary)
+
+
+def run_watch(watch_dir, output_dir, formats=("docx",), jobs=None, options=None, **kwargs):
+    """Arrancar el servicio de vigilancia hasta recibir SIGINT o SIGTERM"""
+    return WatchDaemon(watch_dir, output_dir, formats, jobs, options, **kwargs).run()
@@ -0,0 +1,181 @@
+"""Pruebas del lector de estructura de PDF de fingerprint.py (python -m unittest discover tests)"""
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "opt", "pdfexport"))
+
+import fingerprint  # noqa: E402
+
+
+def build_pdf(contents, numbers=None, object_stream=False, xref_stream=False, catalog_extra=b""):
+    """PDF mínimo con una página por flujo de contenido.
+
+    numbers cambia los números de objeto: {número original: nuevo}. Con
+    object_stream los diccionarios van dentro de un /ObjStm comprimido y con
+    xref_stream la tabla de referencias es un flujo /XRef comprimido.
+    """
+    count = len(contents)
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R" + catalog_extra + b" >>",
+        2: b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (10 + i) for i in range(count)) +
+           b"] /Count %d /Resources << /Font << /F1 3 0 R >> >> >>" % count,
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    streams = {}
+    for index, content in enumerate(contents):
+        objects[10 + index] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                               b"/Contents %d 0 R >>" % (100 + index))
+        streams[100 + index] = content
+    numbers = numbers or {}
+
+    def renumber(value):
+        return fingerprint._REF.sub(lambda m: b"%d 0 R" % numbers.get(int(m.group(1)), int(m.group(1))), value)
+
+    def number(original):
+        return numbers.get(original, original)
+
+    out = b"%PDF-1.5\n"
+    if object_stream:
+        header, body = [], b""
+        for original, value in objects.items():
+            header.append(b"%d %d" % (number(original), len(body)))
+            body += renumber(value) + b"\n"
+        header = b" ".join(header) + b"\n"
+        data = zlib.compress(header + body)
+        out += (b"900 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+                % (len(objects), len(header), len(data)) + data + b"\nendstream\nendobj\n")
+    else:
+        for original, value in objects.items():
+            out += b"%d 0 obj\n" % number(original) + renumber(value) + b"\nendobj\n"
+    for original, content in streams.items():
+        out += (b"%d 0 obj\n<< /Length %d >>\nstream\n" % (number(original), len(content)) + content +
+                b"\nendstream\nendobj\n")
+    if xref_stream:
+        # Entradas ficticias: el lector localiza los objetos sin la tabla de referencias
+        xref = zlib.compress(b"\x01\x00\x00\x00" * 8)
+        out += (b"901 0 obj\n<< /Type /XRef /Size 902 /W [1 2 1] /Root %d 0 R /Filter /FlateDecode "
+                b"/Length %d >>\nstream\n" % (number(1), len(xref)) + xref + b"\nendstream\nendobj\n")
+    else:
+        out += b"trailer\n<< /Root %d 0 R >>\n" % number(1)
+    return out + b"%%EOF\n"
+
+
+PAGES = [b"BT /F1 12 Tf (page %d) Tj ET" % index for index in range(4)]
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def fingerprints(self, data):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_out:
+            pdf_out.write(data)
+        try:
+            return fingerprint.page_fingerprints(pdf_out.name)
+        finally:
+            os.remove(pdf_out.name)
+
+    def test_one_fingerprint_per_page(self):
+        result = self.fingerprints(build_pdf(PAGES))
+        self.assertEqual(len(result), 4)
+        self.assertEqual(len(set(result)), 4)
+
+    def test_edit_changes_only_that_page(self):
+        edited = list(PAGES)
+        edited[2] = b"BT /F1 12 Tf (edited) Tj ET"
+        before, after = self.fingerprints(build_pdf(PAGES)), self.fingerprints(build_pdf(edited))
+        self.assertEqual([a == b for a, b in zip(before, after)], [True, True, False, True])
+
+    def test_identical_pages_share_fingerprint(self):
+        result = self.fingerprints(build_pdf([PAGES[0], PAGES[0]]))
+        self.assertEqual(result[0], result[1])
+
+    def test_renumbered_objects(self):
+        renumbered = {1: 7, 2: 5, 3: 40, 10: 61, 11: 60, 12: 63, 13: 62, 100: 203, 101: 202, 102: 201, 103: 200}
+        self.assertEqual(self.fingerprints(build_pdf(PAGES)),
+                         self.fingerprints(build_pdf(PAGES, renumbered)))
+
+    def test_inserted_page_keeps_other_fingerprints(self):
+        before = self.fingerprints(build_pdf(PAGES))
+        after = self.fingerprints(build_pdf(PAGES[:1] + [b"BT (new) Tj ET"] + PAGES[1:]))
+        self.assertEqual(after[:1] + after[2:], before)
+
+    def test_incremental_update_wins(self):
+        data = build_pdf(PAGES)
+        update = (b"101 0 obj\n<< /Length 14 >>\nstream\nBT (new) Tj ET\nendstream\nendobj\n"
+                  b"trailer\n<< /Root 1 0 R >>\n%%EOF\n")
+        before, after = self.fingerprints(data), self.fingerprints(data + update)
+        self.assertEqual([a == b for a, b in zip(before, after)], [True, False, True, True])
+
+    def test_object_stream(self):
+        self.assertEqual(self.fingerprints(build_pdf(PAGES, object_stream=True)),
+                         self.fingerprints(build_pdf(PAGES)))
+
+    def test_compressed_xref(self):
+        self.assertEqual(self.fingerprints(build_pdf(PAGES, object_stream=True, xref_stream=True)),
+                         self.fingerprints(build_pdf(PAGES)))
+
+    def test_document_resources_affect_every_page(self):
+        before = self.fingerprints(build_pdf(PAGES))
+        after = self.fingerprints(build_pdf(PAGES).replace(b"/Helvetica", b"/Courier"))
+        self.assertFalse(any(a == b for a, b in zip(before, after)))
+
+    def test_encrypted(self):
+        self.assertIsNone(self.fingerprints(build_pdf(PAGES).replace(b"%%EOF", b"% /Encrypt\n%%EOF")))
+
+    def test_malformed_input(self):
+        data, packed = build_pdf(PAGES), build_pdf(PAGES, object_stream=True)
+        start = packed.index(b"stream\n") + len(b"stream\n")
+        for broken in (b"", b"not a pdf", data[:len(data) // 2], data.replace(b">>", b"", 1),
+                       data.replace(b"/Pages 2 0 R", b"/Pages 99 0 R"),
+                       packed.replace(b"/FlateDecode", b"/LZWDecode"),
+                       packed[:start] + b"xx" + packed[start + 2:]):
+            self.assertIsNone(self.fingerprints(broken))
+
+    def test_deeply_nested_arrays(self):
+        nested = b" /Deep " + b"[" * 100000 + b"]" * 100000
+        self.assertEqual(len(self.fingerprints(build_pdf(PAGES, catalog_extra=nested))), 4)
+        self.assertIsNone(self.fingerprints(build_pdf(PAGES, catalog_extra=b" /Deep " + b"[" * 100000)))
+
+
+class DrawingPagesTest(unittest.TestCase):
+
+    def drawings(self, contents, data=None):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_out:
+            pdf_out.write(data or build_pdf(contents))
+        try:
+            return fingerprint.drawing_pages(pdf_out.name)
+        finally:
+            os.remove(pdf_out.name)
+
+    def test_text_only(self):
+        self.assertEqual(self.drawings([b"BT /F1 12 Tf (f S 0 0 m 9 9 l S) Tj ET"]), (False,))
+
+    def test_shapes(self):
+        text = b" BT (x) Tj ET"
+        contents = [b"100 100 200 150 re f" + text, b"0 0 612 792 re S" + text, b"/Sh0 sh" + text,
+                    b"".join(b"72 %d m 540 %d l S " % (y, y) for y in range(100, 800, 50)) + text]
+        self.assertEqual(self.drawings(contents), (True, True, True, True))
+
+    def test_background_and_rules_are_not_drawings(self):
+        text = b" BT (x) Tj ET"
+        contents = [b"1 1 1 rg 0 0 612 792 re f" + text, b"q 2 0 0 2 0 0 cm 0 0 306 396 re f Q" + text,
+                    b"72 100 200 0.5 re f 72 700 m 540 700 l S" + text, b"0 0 m 100 100 l n" + text]
+        self.assertEqual(self.drawings(contents), (False, False, False, False))
+
+    def test_form_xobject(self):
+        data = build_pdf([b"/Fm1 Do"]).replace(b"/F1 3 0 R >>", b"/F1 3 0 R >> /XObject << /Fm1 4 0 R >>")
+        form = b"0 0 100 100 re f"
+        data = data.replace(b"trailer", b"4 0 obj\n<< /Subtype /Form /Matrix [6.12 0 0 7.92 0 0] /Length %d >>\n"
+                            b"stream\n%s\nendstream\nendobj\ntrailer" % (len(form), form))
+        self.assertEqual(self.drawings(None, data), (False,))
+        self.assertEqual(self.drawings(None, data.replace(b"6.12 0 0 7.92", b"1 0 0 1")), (True,))
+
+    def test_deeply_nested_state(self):
+        deep = b"q " * 100000 + b"0 0 m 50 50 l S" + b" Q" * 100000
+        self.assertEqual(self.drawings([deep]), (True,))
+
+
+if __name__ == "__main__":
+    unittest.main()